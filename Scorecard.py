@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 import altair as alt
 import os
+from io import BytesIO
 
 st.set_page_config(layout="wide", page_title="Scorecard — Area View ")
 st.title("🏆 Scorecard — Area View ")
@@ -15,6 +16,8 @@ CASE_SCORES_CSV = os.path.join(SETTINGS_DIR, "case_scores.csv")
 MOBILITY_CSV = os.path.join(SETTINGS_DIR, "mobility.csv")
 QUARTILES_CSV = os.path.join(SETTINGS_DIR, "quartiles.csv")
 
+CREATED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 DEFAULT_ORDER_WEIGHTS = [1.0, 0.75, 0.5, 0.25, 0.25, 0.25, 0.25]
 DEFAULT_CASE_SCORES = {
     "Low Battery": {"moto": 2, "tric": 0},
@@ -29,6 +32,18 @@ DEFAULT_CASE_SCORES = {
     "Deactivate": {"moto": 0, "tric": 0},
 }
 DEFAULT_MOBILITY = {}
+DEFAULT_QUARTILES = pd.DataFrame([
+    ["Q1", 6, 26, "Low Performer"],
+    ["Q2", 27, 47, "Mid Performer"],
+    ["Q3", 48, 68, "Upper-Mid Performer"],
+    ["Q4", 69, 90, "High Performer"],
+], columns=["quartile", "min", "max", "label"])
+# Substrings of every header the column auto-detection below can pick (agent, cases, area, status,
+# created, vehicle, action); other upload columns are never read
+USED_COLUMN_KEYWORDS = (
+    "user", "agent", "name", "case", "area", "zone", "location", "status", "filter",
+    "created", "date", "time", "vehicle", "mobility", "action", "event", "activity", "type",
+)
 
 # Helpers: settings loaders
 def load_order_weights():
@@ -84,32 +99,43 @@ def load_mobility_map():
     return DEFAULT_MOBILITY
 
 
-def get_quartile(score, quartiles_df):
-    """Return quartile label for a given score."""
-    for _, row in quartiles_df.iterrows():
-        try:
-            if float(row["min"]) <= float(score) <= float(row["max"]):
-                return str(row.get("label", "")).strip()
-        except Exception:
-            continue
-    return "Unassigned"
+def quartile_labels(scores: pd.Series, quartiles_df: pd.DataFrame) -> pd.Series:
+    """Label each score with the first quartile row whose [min, max] range contains it ("Q1 – Low Performer")."""
+    mins = pd.to_numeric(quartiles_df["min"], errors="coerce").to_numpy(dtype=float)
+    maxs = pd.to_numeric(quartiles_df["max"], errors="coerce").to_numpy(dtype=float)
+    q = quartiles_df["quartile"] if "quartile" in quartiles_df.columns else pd.Series("", index=quartiles_df.index)
+    lab = quartiles_df["label"] if "label" in quartiles_df.columns else pd.Series("", index=quartiles_df.index)
+    names = (q.astype(str) + " – " + lab.astype(str)).to_numpy(dtype=object)
+
+    vals = pd.to_numeric(scores, errors="coerce").to_numpy(dtype=float)[:, None]
+    # Ranges are inclusive and may leave gaps (e.g. 26 < x < 27), so test each range rather than binning
+    hit = (vals >= mins) & (vals <= maxs)
+    labels = np.full(len(vals), "Unassigned", dtype=object)
+    if len(names):
+        matched = hit.any(axis=1)
+        labels[matched] = names[hit.argmax(axis=1)[matched]]
+    return pd.Series(labels, index=scores.index)
 
 
 # Helpers: cleaning & parsing
 def clean_text_series(s: pd.Series) -> pd.Series:
-    return s.fillna("").astype(str).str.strip().str.strip('"').str.strip("'")
-
-
-def parse_cases_cell(x):
-    if pd.isna(x):
-        return []
-    if isinstance(x, (list, tuple)):
-        return [str(i).strip() for i in x if str(i).strip()]
-    s = str(x)
-    for sep in ["|", ";"]:
-        s = s.replace(sep, ",")
-    items = [p.strip().strip('"').strip("'") for p in s.split(",") if p.strip()]
-    return items
+    # One regex pass trims surrounding whitespace and quote characters
+    return s.fillna("").astype(str).str.replace(r"^[\s\"']+|[\s\"']+$", "", regex=True)
+
+
+def parse_cases_series(s: pd.Series) -> pd.Series:
+    """Split each cell on , | ; into a list of cases, stripping whitespace and quotes."""
+    parts = (
+        pd.Series(s.to_numpy(), dtype=object)
+        .fillna("").astype(str)
+        .str.replace(r"[|;]", ",", regex=True)
+        .str.split(",")
+        .explode()
+    )
+    parts = parts[parts.str.strip() != ""]
+    parts = parts.str.strip().str.strip('"').str.strip("'")
+    lists = parts.groupby(level=0, sort=False).agg(list).reindex(range(len(s)))
+    return pd.Series([v if isinstance(v, list) else [] for v in lists], index=s.index, dtype=object)
 
 
 def find_created_column(df: pd.DataFrame):
@@ -128,55 +154,181 @@ def find_created_column(df: pd.DataFrame):
     return None
 
 
-def compute_task_score(case_list, mobility_type, case_scores, order_weights):
-    if not isinstance(case_list, (list, tuple)):
-        return 0.0
-    mobility_key = "moto"
-    if isinstance(mobility_type, str) and mobility_type.strip().lower().startswith("tr"):
-        mobility_key = "tric"
-    total = 0.0
-    for pos, case_name in enumerate(case_list):
-        if not case_name or not str(case_name).strip():
-            continue
-        weight = order_weights[pos] if pos < len(order_weights) else order_weights[-1]
-        key = str(case_name).strip()
-        lookup = case_scores.get(key)
-        if lookup is None:
-            for k in case_scores.keys():
-                if k.strip().lower() == key.lower():
-                    lookup = case_scores[k]
-                    break
-        if lookup is None:
-            continue
-        score_val = lookup.get(mobility_key, 0) or 0
+def parse_created_series(raw: pd.Series) -> pd.Series:
+    """Parse Created At with the export's fixed format; only fall back to inference when most values don't match."""
+    created = pd.to_datetime(raw, format=CREATED_AT_FORMAT, errors="coerce")
+    if created.isna().mean() > 0.5:
+        created = pd.to_datetime(raw, errors="coerce")
+        if created.isna().all():
+            created = pd.to_datetime(raw.astype(str).str.slice(0, 19), errors="coerce")
+    return created
+
+
+def compute_task_scores(cases_lists: pd.Series, mobility: pd.Series, case_scores, order_weights) -> pd.Series:
+    """Score every task at once: explode case lists to long form, look up case scores, apply positional weights."""
+    n = len(cases_lists)
+    long = pd.DataFrame({
+        "_row": np.arange(n),
+        "_case": cases_lists.to_numpy(),
+        "_mobility": mobility.to_numpy(),
+    }).explode("_case")
+    # Position within the original list (empty entries still occupy a slot)
+    long["_pos"] = long.groupby("_row").cumcount().to_numpy()
+    long = long[long["_case"].notna()]
+    long["_case"] = long["_case"].astype(str).str.strip()
+    long = long[long["_case"] != ""]
+    if long.empty:
+        return pd.Series(0.0, index=cases_lists.index)
+
+    # Exact case-name match first, then case-insensitive fallback
+    lookup = pd.DataFrame.from_dict(case_scores, orient="index").reindex(columns=["moto", "tric"])
+    lookup = lookup.apply(pd.to_numeric, errors="coerce").fillna(0.0)
+    lookup_ci = lookup.groupby(lookup.index.astype(str).str.strip().str.lower(), sort=False).first()
+    vals = lookup.reindex(long["_case"]).to_numpy(dtype=float)
+    vals_ci = lookup_ci.reindex(long["_case"].str.lower()).to_numpy(dtype=float)
+    vals = np.nan_to_num(np.where(np.isnan(vals), vals_ci, vals))
+
+    is_tric = long["_mobility"].astype(str).str.strip().str.lower().str.startswith("tr").to_numpy()
+    weights = np.asarray(order_weights, dtype=float)
+    pos_w = weights[np.minimum(long["_pos"].to_numpy(), len(weights) - 1)]
+    scores = np.where(is_tric, vals[:, 1], vals[:, 0]) * pos_w
+
+    totals = np.bincount(long["_row"].to_numpy(dtype=np.int64), weights=scores, minlength=n)
+    return pd.Series(totals, index=cases_lists.index)
+
+
+def resolve_mobility(agent_names: pd.Series, raw_vals: pd.Series, mobility_map) -> pd.Series:
+    """Vectorized mobility resolution: settings map first, raw vehicle column as fallback."""
+    # "TRI" also covers "TRIC"; anything else (MOTO/MOT/BIKE/unknown) resolves to MOTO
+    is_tric = raw_vals.astype(str).str.upper().str.contains("TRI", regex=False).to_numpy()
+    if mobility_map:
+        mapped = agent_names.map(mobility_map).fillna("").astype(str)
+        mapped_up = mapped.str.strip().str.upper()
+        is_tric_map = mapped_up.str.contains("TRIC", regex=False) | mapped_up.str.startswith("TR")
+        is_tric = np.where(mapped != "", is_tric_map, is_tric)
+    return pd.Series(np.where(is_tric, "TRIC", "MOTO"), index=agent_names.index)
+
+
+# Cached stages: keyed on upload bytes / settings so widget reruns skip parsing
+def file_mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def settings_mtimes():
+    return tuple(file_mtime(p) for p in (WEIGHTS_CSV, CASE_SCORES_CSV, MOBILITY_CSV))
+
+
+@st.cache_data(ttl=3600)
+def load_settings(mtimes):
+    """Loads (order_weights, case_scores, mobility_map); `mtimes` invalidates the cache when a settings file is saved."""
+    return load_order_weights(), load_case_scores(), load_mobility_map()
+
+
+@st.cache_data(ttl=3600)
+def load_quartiles(mtime):
+    """Loads quartile ranges; `mtime` invalidates the cache when quartiles.csv is saved."""
+    if os.path.exists(QUARTILES_CSV):
         try:
-            total += float(score_val) * float(weight)
-        except:
-            continue
-    return float(total)
+            return pd.read_csv(QUARTILES_CSV)
+        except Exception:
+            pass
+    return DEFAULT_QUARTILES.copy()
+
+
+@st.cache_data(ttl=3600)
+def load_raw(file_bytes: bytes, name: str) -> pd.DataFrame:
+    """Parses the uploaded CSV/Excel bytes, reading only the columns the page can use."""
+    def is_used(col):
+        col = str(col).lower()
+        return any(k in col for k in USED_COLUMN_KEYWORDS)
+
+    if name.lower().endswith(".csv"):
+        # pyarrow hands back raw bytes instead of raising on bad UTF-8, so pick the encoding up front.
+        try:
+            file_bytes.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            encoding = "latin1"
+        # pyarrow selects columns by exact name, so resolve them from the header first.
+        header = pd.read_csv(BytesIO(file_bytes), nrows=0, encoding=encoding)
+        usecols = [c for c in header.columns if is_used(c)]
+        try:
+            from pyarrow import csv as pa_csv, string as pa_string
+            # Created At stays text for parse_created_series: pyarrow's inference would turn offset-bearing
+            # values into UTC, and pandas' engine="pyarrow" only applies dtype= after that, so set the type here.
+            created_col = find_created_column(header)
+            convert_options = pa_csv.ConvertOptions(
+                include_columns=usecols,
+                column_types={created_col: pa_string()} if created_col in usecols else {},
+                strings_can_be_null=True,
+            )
+            table = pa_csv.read_csv(
+                BytesIO(file_bytes), read_options=pa_csv.ReadOptions(encoding=encoding), convert_options=convert_options
+            )
+            return table.to_pandas()
+        except (ImportError, ValueError):
+            return pd.read_csv(BytesIO(file_bytes), usecols=usecols, encoding=encoding)
+    return pd.read_excel(BytesIO(file_bytes), usecols=is_used)
+
+
+@st.cache_data(ttl=3600)
+def preprocess(df_raw, agent_col, cases_col, area_col, created_col, status_col, mobility_raw_col,
+               case_scores, order_weights, mobility_map):
+    """Builds the cleaned working frame, including per-task scores (which don't depend on the UI filters)."""
+    df = df_raw.copy()
+    df["_agent_clean"] = clean_text_series(df[agent_col])
+    df["_area_clean"] = clean_text_series(df[area_col]) if area_col else "Unknown"
+    df["_cases_list"] = parse_cases_series(df[cases_col])
+    df["_created_raw"] = df[created_col]
+    df["_created_dt"] = parse_created_series(df["_created_raw"])
+    df["_created_day"] = df["_created_dt"].dt.date
+
+    if status_col:
+        df["_status_clean"] = clean_text_series(df[status_col]).str.lower()
+        df["_is_success"] = df["_status_clean"].isin(["success", "completed", "ok", "done", "true", "1"])
+    else:
+        df["_is_success"] = True
+
+    df["_mobility_raw"] = clean_text_series(df[mobility_raw_col]) if mobility_raw_col else ""
+    df["_mobility"] = resolve_mobility(df["_agent_clean"], df["_mobility_raw"], mobility_map)
+    df["_task_score"] = compute_task_scores(df["_cases_list"], df["_mobility"], case_scores, order_weights)
+
+    # Repeated labels used as group-by keys / equality filters: store as int-coded categories
+    for col in ["_agent_clean", "_area_clean", "_mobility", "_status_clean"]:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def area_chart_groups(df_success: pd.DataFrame):
+    """Per-area agent daily scores and case counts for the area charts, keyed by area."""
+    agent_ts_groups = dict(list(
+        df_success.groupby(["_area_clean", "_agent_clean", "_created_day"], observed=True)["_task_score"].sum()
+        .reset_index()
+        .groupby("_area_clean", sort=False, observed=True)
+    ))
+    area_cases = df_success[["_area_clean", "_cases_list"]].explode("_cases_list")
+    area_cases = area_cases[area_cases["_cases_list"].notna() & (area_cases["_cases_list"] != "")]
+    case_mix_groups = dict(list(
+        area_cases.groupby("_area_clean", observed=True)["_cases_list"].value_counts()
+        .rename("Count").reset_index()
+        .groupby("_area_clean", sort=False, observed=True)
+    ))
+    return agent_ts_groups, case_mix_groups
+
+
+@st.cache_data(ttl=3600)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """CSV payload for download buttons; unchanged aggregates reuse the encoded bytes across reruns."""
+    return df.to_csv(index=False).encode("utf-8")
 
 
 # Load settings
-order_weights = load_order_weights()
-case_scores = load_case_scores()
-mobility_map = load_mobility_map()
+order_weights, case_scores, mobility_map = load_settings(settings_mtimes())
 st.sidebar.info("Settings folder: place order_weights.csv, case_scores.csv, mobility.csv (optional).")
 
 # Load quartiles from settings/quartiles.csv or fallback to defaults
-DEFAULT_QUARTILES = pd.DataFrame([
-    ["Q1", 6, 26, "Low Performer"],
-    ["Q2", 27, 47, "Mid Performer"],
-    ["Q3", 48, 68, "Upper-Mid Performer"],
-    ["Q4", 69, 90, "High Performer"],
-], columns=["quartile", "min", "max", "label"])
-
-if os.path.exists(QUARTILES_CSV):
-    try:
-        quartiles_df = pd.read_csv(QUARTILES_CSV)
-    except:
-        quartiles_df = DEFAULT_QUARTILES.copy()
-else:
-    quartiles_df = DEFAULT_QUARTILES.copy()
+quartiles_df = load_quartiles(file_mtime(QUARTILES_CSV))
 
 # Upload data
 uploaded = st.file_uploader("Upload Scorecard Raw Data (.xlsx/.csv)", type=["xlsx", "xls", "csv"])
@@ -184,14 +336,7 @@ if not uploaded:
     st.stop()
 
 try:
-    if uploaded.name.lower().endswith(".csv"):
-        try:
-            df_raw = pd.read_csv(uploaded)
-        except UnicodeDecodeError:
-            uploaded.seek(0)
-            df_raw = pd.read_csv(uploaded, encoding="latin1")
-    else:
-        df_raw = pd.read_excel(uploaded)
+    df_raw = load_raw(uploaded.getvalue(), uploaded.name)
 except Exception as e:
     st.error(f"Error loading file: {e}")
     st.stop()
@@ -248,21 +393,34 @@ if created_col is None:
     st.error("Could not detect a date/time column (Created At). Add a 'Created At' column or similar.")
     st.stop()
 
+status_col = status_col_guess if (status_col_guess and status_col_guess in df_raw.columns) else None
+
+mobility_raw_col = None
+for cand in ["vehicle", "mobility", "vehicle type", "vehicle_type"]:
+    for c in df_raw.columns:
+        if c.lower() == cand:
+            mobility_raw_col = c
+            break
+    if mobility_raw_col:
+        break
+
+# Preprocess & clean
+df = preprocess(
+    df_raw, agent_col_guess, cases_col_guess,
+    area_col_guess if area_col_guess and area_col_guess in df_raw.columns else None,
+    created_col, status_col, mobility_raw_col,
+    case_scores, order_weights, mobility_map,
+)
+
 # Build unique lists for filters (cleaned)
-agent_values = clean_text_series(df_raw[agent_col_guess]).replace("", np.nan).dropna().unique().tolist()
+agent_values = [a for a in df["_agent_clean"].unique().tolist() if a != ""]
 agent_values = sorted(agent_values)
 area_values = []
 if area_col_guess and area_col_guess in df_raw.columns:
-    area_values = clean_text_series(df_raw[area_col_guess]).replace("", np.nan).dropna().unique().tolist()
+    area_values = [a for a in df["_area_clean"].unique().tolist() if a != ""]
     area_values = sorted(area_values)
-cases_all = []
-if cases_col_guess in df_raw.columns:
-    parsed = df_raw[cases_col_guess].apply(parse_cases_cell).tolist()
-    for li in parsed:
-        for c in li:
-            if c and str(c).strip():
-                cases_all.append(str(c).strip())
-cases_values = sorted(list(pd.Series(cases_all).dropna().unique())) if cases_all else []
+cases_all = df["_cases_list"].explode().dropna().astype(str).str.strip()
+cases_values = sorted(cases_all[cases_all != ""].unique().tolist())
 
 # Main-page filters (single-select)
 st.markdown("### Filters")
@@ -274,48 +432,6 @@ with c2:
 with c3:
     case_choice = st.selectbox("Case (single select)", options=["All"] + cases_values if cases_values else ["All"], index=0)
 
-# Preprocess & clean
-df = df_raw.copy()
-df["_agent_clean"] = clean_text_series(df[agent_col_guess])
-df["_area_clean"] = clean_text_series(df[area_col_guess]) if area_col_guess and area_col_guess in df.columns else "Unknown"
-df["_cases_list"] = df[cases_col_guess].apply(parse_cases_cell) if cases_col_guess and cases_col_guess in df.columns else [[] for _ in range(len(df))]
-df["_created_raw"] = df[created_col]
-df["_created_dt"] = pd.to_datetime(df["_created_raw"], errors="coerce")
-if df["_created_dt"].isna().all():
-    df["_created_dt"] = pd.to_datetime(df["_created_raw"].astype(str).str.slice(0, 19), errors="coerce")
-df["_created_day"] = df["_created_dt"].dt.date
-
-status_col = status_col_guess if (status_col_guess and status_col_guess in df.columns) else None
-if status_col:
-    df["_status_clean"] = clean_text_series(df[status_col]).str.lower()
-    df["_is_success"] = df["_status_clean"].isin(["success", "completed", "ok", "done", "true", "1"])
-else:
-    df["_is_success"] = True
-
-mobility_raw_col = None
-for cand in ["vehicle", "mobility", "vehicle type", "vehicle_type"]:
-    for c in df.columns:
-        if c.lower() == cand:
-            mobility_raw_col = c
-            break
-    if mobility_raw_col:
-        break
-df["_mobility_raw"] = clean_text_series(df[mobility_raw_col]) if mobility_raw_col else ""
-def resolve_mobility_for_row(agent_name, raw_val):
-    m = mobility_map.get(agent_name)
-    if m:
-        mm = str(m).strip().upper()
-        if "TRIC" in mm or mm.startswith("TR"):
-            return "TRIC"
-        return "MOTO"
-    v = str(raw_val).upper()
-    if "TRIC" in v or "TRI" in v:
-        return "TRIC"
-    if "MOTO" in v or "MOT" in v or "BIKE" in v:
-        return "MOTO"
-    return "MOTO"
-df["_mobility"] = df.apply(lambda r: resolve_mobility_for_row(r["_agent_clean"], r.get("_mobility_raw", "")), axis=1)
-
 # Filter to successful rows
 df_success = df[df["_is_success"]].copy()
 
@@ -325,18 +441,13 @@ if agent_choice != "All":
 if area_choice != "All":
     df_success = df_success[df_success["_area_clean"] == area_choice]
 if case_choice != "All":
-    df_success = df_success[df_success["_cases_list"].apply(lambda lst: case_choice in lst)]
-
-# Compute task scores
-if not df_success.empty:
-    df_success["_task_score"] = df_success.apply(lambda r: compute_task_score(r["_cases_list"], r["_mobility"], case_scores, order_weights), axis=1)
-else:
-    df_success["_task_score"] = pd.Series(dtype=float)
+    filter_cases = df_success["_cases_list"].explode()
+    df_success = df_success[df_success.index.isin(filter_cases.index[filter_cases == case_choice])]
 
 # Agent & area aggregates (no avg_score column)
 if not df_success.empty:
     agent_agg = (
-        df_success.groupby(["_area_clean", "_agent_clean"], dropna=False)
+        df_success.groupby(["_area_clean", "_agent_clean"], dropna=False, observed=True)
         .agg(total_score=pd.NamedAgg(column="_task_score", aggfunc="sum"),
              tasks=pd.NamedAgg(column="_task_score", aggfunc="count"))
         .reset_index()
@@ -344,11 +455,12 @@ if not df_success.empty:
 else:
     agent_agg = pd.DataFrame(columns=["_area_clean", "_agent_clean", "total_score", "tasks"])
 
-if not agent_agg.empty:
+# Area totals come straight from the task rows rather than a second group-by over agent_agg
+if not df_success.empty:
     area_agg = (
-        agent_agg.groupby("_area_clean", dropna=False)
-        .agg(total_score=pd.NamedAgg(column="total_score", aggfunc="sum"),
-             successful_tasks=pd.NamedAgg(column="tasks", aggfunc="sum"),
+        df_success.groupby("_area_clean", dropna=False, observed=True)
+        .agg(total_score=pd.NamedAgg(column="_task_score", aggfunc="sum"),
+             successful_tasks=pd.NamedAgg(column="_task_score", aggfunc="count"),
              agents_count=pd.NamedAgg(column="_agent_clean", aggfunc="nunique"),
              )
         .reset_index()
@@ -415,7 +527,7 @@ st.subheader("📈 Area Performance Over Time")
 if "_created_day" not in df_success.columns or df_success["_created_day"].isna().all():
     st.info("Created At dates not available or could not be parsed for timeline chart.")
 else:
-    area_time = df_success.groupby(["_area_clean", "_created_day"])["_task_score"].sum().reset_index()
+    area_time = df_success.groupby(["_area_clean", "_created_day"], observed=True)["_task_score"].sum().reset_index()
     area_time = area_time.rename(columns={"_area_clean": "Area", "_created_day": "Day", "_task_score": "TotalScore"})
     if not area_time.empty:
         sel_area = alt.selection_multi(fields=["Area"], bind="legend")
@@ -443,24 +555,30 @@ areas_to_show = area_agg["_area_clean"].tolist() if not area_agg.empty else ([ar
 if not areas_to_show:
     st.info("No area details to show for the current filters.")
 else:
+    # Partition once by area instead of re-scanning df_success / agent_agg inside the loop
+    area_groups = dict(list(df_success.groupby("_area_clean", sort=False, observed=True)))
+    # Sorted once by score within area, so each per-area slice is already ranked
+    agent_agg_sorted = agent_agg.sort_values(["_area_clean", "total_score"], ascending=[True, False])
+    agent_groups = dict(list(agent_agg_sorted.groupby("_area_clean", sort=False, observed=True)))
+    area_rows = area_agg.set_index("_area_clean")
+    # Chart inputs are aggregated once for all areas, the first time a "Show charts" toggle returns True;
+    # the loop then only slices them.
+    chart_groups = None
     for area_name in areas_to_show:
-        row = area_agg[area_agg["_area_clean"] == area_name]
-        if row.empty:
-            df_area = df_success[df_success["_area_clean"] == area_name]
+        df_area = area_groups.get(area_name, df_success.iloc[0:0])
+        area_agents = agent_groups.get(area_name, agent_agg.iloc[0:0])
+        if area_name not in area_rows.index:
             total_score = df_area["_task_score"].sum() if not df_area.empty else 0.0
             successful_tasks = len(df_area)
             distinct_agents_count = df_area["_agent_clean"].nunique() if not df_area.empty else 0
         else:
-            total_score = float(row["total_score"].iat[0])
-            successful_tasks = int(row["successful_tasks"].iat[0])
-            distinct_agents_count = int(row["agents_count"].iat[0])
+            row = area_rows.loc[area_name]
+            total_score = float(row["total_score"])
+            successful_tasks = int(row["successful_tasks"])
+            distinct_agents_count = int(row["agents_count"])
 
         # Average Score (Area) computed from agent_agg for that area
-        if not agent_agg.empty and area_name in agent_agg["_area_clean"].values:
-            area_agents = agent_agg[agent_agg["_area_clean"] == area_name]
-            avg_area_score = float(area_agents["total_score"].mean()) if not area_agents.empty else 0.0
-        else:
-            avg_area_score = 0.0
+        avg_area_score = float(area_agents["total_score"].mean()) if not area_agents.empty else 0.0
 
         with st.expander(f"{area_name} — Total Score: {total_score:.2f} — Tasks: {successful_tasks} — Agents: {distinct_agents_count}", expanded=False):
             a1, a2, a3, a4 = st.columns([1, 1, 1, 2])
@@ -469,8 +587,11 @@ else:
             a3.metric("Distinct Agents", f"{distinct_agents_count:,}")
             a4.metric("Average Score (Area)", f"{avg_area_score:.2f}")
 
+            # Charts are only built on request; every collapsed expander body still runs on each rerun
+            show_charts = st.toggle("Show charts", key=f"area_charts_{area_name}")
+
             # Agent ranking table with quartiles
-            agents_in_area = agent_agg[agent_agg["_area_clean"] == area_name].sort_values("total_score", ascending=False)
+            agents_in_area = area_agents
             if agents_in_area.empty:
                 st.info("No agent score data for this area under current filters.")
             else:
@@ -493,29 +614,8 @@ else:
                     .str.strip("'")
                 )
 
-                # Load quartiles from settings folder
-                try:
-                    quartiles_df = pd.read_csv(os.path.join("settings", "quartiles.csv"))
-                except:
-                    quartiles_df = pd.DataFrame([
-                        ["Q1", 6, 26, "Low Performer"],
-                        ["Q2", 27, 47, "Mid Performer"],
-                        ["Q3", 48, 68, "Upper-Mid Performer"],
-                        ["Q4", 69, 90, "High Performer"],
-                    ], columns=["quartile", "min", "max", "label"])
-
-                # Function to classify quartile
-                def get_quartile_label(score):
-                    for _, row in quartiles_df.iterrows():
-                        try:
-                            if float(row["min"]) <= float(score) <= float(row["max"]):
-                                return row.get("quartile", "") + " – " + str(row.get("label", ""))
-                        except:
-                            continue
-                    return "Unassigned"
-
                 # Add Quartile column
-                agents_display["Quartile"] = agents_display["Score"].apply(get_quartile_label)
+                agents_display["Quartile"] = quartile_labels(agents_display["Score"], quartiles_df)
 
                 # Reset index for display and hide index
                 agents_display = agents_display.reset_index(drop=True)
@@ -530,68 +630,70 @@ else:
                 )
 
                 # Agent bars
-                st.markdown("**Agent Scores (bars)**")
-                bar_df = agents_display.copy()
-
-                if not bar_df.empty:
-                    bar_chart = (
-                        alt.Chart(bar_df)
-                        .mark_bar()
-                        .encode(
-                            x=alt.X("Score:Q"),
-                            y=alt.Y("Agent:N", sort="-x"),
-                            color=alt.Color("Quartile:N", legend=alt.Legend(title="Quartile")),
-                            tooltip=["Agent", "Score", "Tasks", "Quartile"]
+                if show_charts:
+                    st.markdown("**Agent Scores (bars)**")
+                    bar_df = agents_display.copy()
+
+                    if not bar_df.empty:
+                        bar_chart = (
+                            alt.Chart(bar_df)
+                            .mark_bar()
+                            .encode(
+                                x=alt.X("Score:Q"),
+                                y=alt.Y("Agent:N", sort="-x"),
+                                color=alt.Color("Quartile:N", legend=alt.Legend(title="Quartile")),
+                                tooltip=["Agent", "Score", "Tasks", "Quartile"]
+                            )
+                            .properties(height=min(300, 40 + 25 * len(bar_df)))
                         )
-                        .properties(height=min(300, 40 + 25 * len(bar_df)))
+                        st.altair_chart(bar_chart, use_container_width=True)
+
+            if show_charts:
+                if chart_groups is None:
+                    chart_groups = area_chart_groups(df_success)
+                agent_ts_groups, case_mix_groups = chart_groups
+
+                # Case mix pie
+                st.markdown("**Case Mix (this area's successful tasks)**")
+                case_counts = case_mix_groups.get(area_name)
+                if case_counts is not None and not case_counts.empty:
+                    case_counts = case_counts[["_cases_list", "Count"]].reset_index(drop=True)
+                    case_counts.columns = ["Case", "Count"]
+                    pie = (
+                        alt.Chart(case_counts)
+                        .mark_arc()
+                        .encode(theta=alt.Theta("Count:Q"), color=alt.Color("Case:N"), tooltip=["Case", "Count"])
+                        .properties(height=300)
                     )
-                    st.altair_chart(bar_chart, use_container_width=True)
-
-            # Case mix pie
-            st.markdown("**Case Mix (this area's successful tasks)**")
-            df_area_tasks = df_success[df_success["_area_clean"] == area_name]
-            all_cases = []
-            for li in df_area_tasks["_cases_list"].tolist():
-                all_cases.extend([c for c in li if c])
-            if all_cases:
-                case_counts = pd.Series(all_cases).value_counts().reset_index()
-                case_counts.columns = ["Case", "Count"]
-                pie = (
-                    alt.Chart(case_counts)
-                    .mark_arc()
-                    .encode(theta=alt.Theta("Count:Q"), color=alt.Color("Case:N"), tooltip=["Case", "Count"])
-                    .properties(height=300)
-                )
-                st.altair_chart(pie, use_container_width=True)
-            else:
-                st.info("No cases found for this area under current filters.")
-
-            # Per-area agent time-series
-            st.markdown("**📈 Agent Performance Over Time**")
-            df_area_ts = df_success[df_success["_area_clean"] == area_name].copy()
-            if ("_created_day" in df_area_ts.columns) and (not df_area_ts["_created_day"].isna().all()):
-                agent_time = df_area_ts.groupby(["_agent_clean", "_created_day"])["_task_score"].sum().reset_index()
-                agent_time = agent_time.rename(columns={"_agent_clean": "Agent", "_created_day": "Day", "_task_score": "TotalScore"})
-                if not agent_time.empty:
-                    sel_agent = alt.selection_multi(fields=["Agent"], bind="legend")
-                    agent_line = (
-                        alt.Chart(agent_time)
-                        .mark_line(point=True)
-                        .encode(
-                            x=alt.X("Day:T", title="Day", axis=alt.Axis(format="%Y-%m-%d")),
-                            y=alt.Y("TotalScore:Q", title="Total Score"),
-                            color=alt.Color("Agent:N", title="Agent"),
-                            opacity=alt.condition(sel_agent, alt.value(1), alt.value(0.15)),
-                            tooltip=["Agent", "Day", "TotalScore"]
+                    st.altair_chart(pie, use_container_width=True)
+                else:
+                    st.info("No cases found for this area under current filters.")
+
+                # Per-area agent time-series
+                st.markdown("**📈 Agent Performance Over Time**")
+                if ("_created_day" in df_area.columns) and (not df_area["_created_day"].isna().all()):
+                    agent_time = agent_ts_groups.get(area_name, df_area.iloc[0:0])[["_agent_clean", "_created_day", "_task_score"]].reset_index(drop=True)
+                    agent_time = agent_time.rename(columns={"_agent_clean": "Agent", "_created_day": "Day", "_task_score": "TotalScore"})
+                    if not agent_time.empty:
+                        sel_agent = alt.selection_multi(fields=["Agent"], bind="legend")
+                        agent_line = (
+                            alt.Chart(agent_time)
+                            .mark_line(point=True)
+                            .encode(
+                                x=alt.X("Day:T", title="Day", axis=alt.Axis(format="%Y-%m-%d")),
+                                y=alt.Y("TotalScore:Q", title="Total Score"),
+                                color=alt.Color("Agent:N", title="Agent"),
+                                opacity=alt.condition(sel_agent, alt.value(1), alt.value(0.15)),
+                                tooltip=["Agent", "Day", "TotalScore"]
+                            )
+                            .add_params(sel_agent)
+                            .properties(height=360)
                         )
-                        .add_params(sel_agent)
-                        .properties(height=360)
-                    )
-                    st.altair_chart(agent_line, use_container_width=True)
+                        st.altair_chart(agent_line, use_container_width=True)
+                    else:
+                        st.info("Not enough agent time-series data for this area.")
                 else:
-                    st.info("Not enough agent time-series data for this area.")
-            else:
-                st.info("Created At dates not available or could not be parsed for agent timeline.")
+                    st.info("Created At dates not available or could not be parsed for agent timeline.")
 
             st.markdown("---")
 
@@ -600,10 +702,10 @@ st.markdown("---")
 st.subheader("Download aggregated results (filtered)")
 col_d1, col_d2 = st.columns(2)
 with col_d1:
-    csv_area = area_agg.to_csv(index=False).encode("utf-8")
+    csv_area = to_csv_bytes(area_agg)
     st.download_button("Download area_aggregates.csv", csv_area, file_name="area_aggregates.csv", mime="text/csv")
 with col_d2:
-    csv_agent = agent_agg.to_csv(index=False).encode("utf-8")
+    csv_agent = to_csv_bytes(agent_agg)
     st.download_button("Download agent_aggregates.csv", csv_agent, file_name="agent_aggregates.csv", mime="text/csv")
 
 st.success("Area View ready.")
@@ -623,7 +725,7 @@ if action_col_guess:
     df["_action_clean"] = clean_text_series(df[action_col_guess]).str.upper()
 
     time_rows = []
-    for (agent, day), g in df.groupby(["_agent_clean", "_created_day"]):
+    for (agent, day), g in df.groupby(["_agent_clean", "_created_day"], observed=True):
         g = g.sort_values("_created_dt")
 
         checkins = g[g["_action_clean"] == "OPS_USER_CHECKIN"]
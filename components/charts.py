@@ -1,9 +1,41 @@
 import altair as alt
 import pandas as pd
+import streamlit as st
 
-def dod_chart(df):
+# Cached aggregations; callers pass only the columns used so the cache key stays small.
+
+@st.cache_data(ttl=3600)
+def _dod_agg(df):
     data = df.groupby('Created Date').size().reset_index(name='records')
     data['Created Date'] = pd.to_datetime(data['Created Date']).dt.date
+    return data
+
+@st.cache_data(ttl=3600)
+def _count_agg(df, col):
+    return df.groupby(col).size().reset_index(name='count').sort_values('count',ascending=False)
+
+@st.cache_data(ttl=3600)
+def _dual_line_agg(df):
+    data = df.groupby('Created Date').agg({'On Queue Time':'mean','Resolution Time':'mean'}).reset_index()
+    data['Created Date'] = pd.to_datetime(data['Created Date']).dt.date
+    return data.melt(id_vars=['Created Date'], value_vars=['On Queue Time','Resolution Time'], var_name='metric', value_name='value')
+
+@st.cache_data(ttl=3600)
+def _case_trends_agg(df):
+    data = df.groupby(['Created Date','Main Case']).size().reset_index(name='count')
+    data['Created Date'] = pd.to_datetime(data['Created Date']).dt.date
+    return data
+
+@st.cache_data(ttl=3600)
+def _interval_agg(df):
+    data = df.dropna(subset=['Interval','Created Date']).copy()
+    data['Interval'] = data['Interval'].astype(int)
+    table = data.groupby(['Created Date','Interval']).size().reset_index(name='count')
+    table['Created Date'] = pd.to_datetime(table['Created Date']).dt.date
+    return table
+
+def dod_chart(df):
+    data = _dod_agg(df[['Created Date']])
     chart = alt.Chart(data).mark_bar().encode(
         x=alt.X('Created Date:T', title='Created Date', timeUnit='yearmonthdate'),
         y=alt.Y('records:Q', title='Records')
@@ -11,7 +43,7 @@ def dod_chart(df):
     return chart
 
 def case_reasons_chart(df):
-    data = df.groupby('Main Case').size().reset_index(name='count').sort_values('count',ascending=False)
+    data = _count_agg(df[['Main Case']], 'Main Case')
     chart = alt.Chart(data.head(20)).mark_bar().encode(
         x=alt.X('count:Q'),
         y=alt.Y('Main Case:N', sort='-x')
@@ -19,7 +51,7 @@ def case_reasons_chart(df):
     return chart
 
 def area_chart(df):
-    data = df.groupby('Area').size().reset_index(name='count').sort_values('count',ascending=False)
+    data = _count_agg(df[['Area']], 'Area')
     chart = alt.Chart(data.head(20)).mark_bar().encode(
         x=alt.X('count:Q'),
         y=alt.Y('Area:N', sort='-x')
@@ -27,9 +59,7 @@ def area_chart(df):
     return chart
 
 def dual_line_times(df):
-    data = df.groupby('Created Date').agg({'On Queue Time':'mean','Resolution Time':'mean'}).reset_index()
-    data['Created Date'] = pd.to_datetime(data['Created Date']).dt.date
-    data_m = data.melt(id_vars=['Created Date'], value_vars=['On Queue Time','Resolution Time'], var_name='metric', value_name='value')
+    data_m = _dual_line_agg(df[['Created Date','On Queue Time','Resolution Time']])
     chart = alt.Chart(data_m).mark_line(point=True).encode(
         x=alt.X('Created Date:T', timeUnit='yearmonthdate'),
         y=alt.Y('value:Q'),
@@ -38,8 +68,7 @@ def dual_line_times(df):
     return chart
 
 def multi_case_trends(df):
-    data = df.groupby(['Created Date','Main Case']).size().reset_index(name='count')
-    data['Created Date'] = pd.to_datetime(data['Created Date']).dt.date
+    data = _case_trends_agg(df[['Created Date','Main Case']])
     chart = alt.Chart(data).mark_line().encode(
         x=alt.X('Created Date:T', timeUnit='yearmonthdate'),
         y='count:Q',
@@ -49,10 +78,7 @@ def multi_case_trends(df):
     return chart
 
 def interval_heatmap(df):
-    data = df.dropna(subset=['Interval','Created Date']).copy()
-    data['Interval'] = data['Interval'].astype(int)
-    table = data.groupby(['Created Date','Interval']).size().reset_index(name='count')
-    table['Created Date'] = pd.to_datetime(table['Created Date']).dt.date
+    table = _interval_agg(df[['Created Date','Interval']])
     chart = alt.Chart(table).mark_rect().encode(
         x=alt.X('Interval:O', title='Interval (hour bucket)'),
         y=alt.Y('Created Date:T', title='Date', sort='-x', timeUnit='yearmonthdate'),
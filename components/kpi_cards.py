@@ -3,11 +3,12 @@ import math
 def render_kpis(df):
     k1,k2,k3,k4,k5,k6,k7 = st.columns([1,1,1,1,1,1,1])
     num = int(df.shape[0]) if df is not None else 0
-    med_on = df['On Queue Time'].median(skipna=True)
-    med_hand = df['Handling Time'].median(skipna=True)
-    avg_res = df['Resolution Time'].mean(skipna=True)
-    avg_on = df['On Queue Time'].mean(skipna=True)
-    avg_hand = df['Handling Time'].mean(skipna=True)
+    stats = df[['On Queue Time','Handling Time','Resolution Time']].agg(['median','mean'])
+    med_on = stats.at['median','On Queue Time']
+    med_hand = stats.at['median','Handling Time']
+    avg_res = stats.at['mean','Resolution Time']
+    avg_on = stats.at['mean','On Queue Time']
+    avg_hand = stats.at['mean','Handling Time']
     def fmt(x):
         if x is None or (isinstance(x,float) and (math.isnan(x))):
             return '0'
@@ -4,8 +4,12 @@ import numpy as np
 import altair as alt
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from io import BytesIO
 import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # ==============================
 # CONSTANTS
@@ -13,6 +17,8 @@ import datetime
 MIN_CHART_HEIGHT = 500
 PIXELS_PER_NEIGHBORHOOD = 40
 MAX_DATE_RANGE_DAYS = 365
+FETCH_WORKERS = 4
+DAILY_FETCH_MAX_DAYS = 31
 
 TIME_INTERVALS = {
     "Morning Peak (6a-12p)": (6, 11),
@@ -21,6 +27,21 @@ TIME_INTERVALS = {
 }
 INTERVAL_ORDER = ["Morning Peak (6a-12p)", "Afternoon Peak (12p-6p)", "Evening/Night (6p-6a)"]
 GRANULARITY_OPTIONS = ["Hourly (0-23)", "3 Intervals"]
+DEMAND_METRICS = ["Rides", "Sessions", "Urgent_Vehicles"]
+CHART_BACKGROUND = "#0e1117"
+# Shared Vega-Lite config for the dict specs; no view border, as Altair's configure_view(strokeWidth=0) gave
+CHART_CONFIG = {"background": CHART_BACKGROUND, "view": {"strokeWidth": 0}}
+AXIS_STYLE = {
+    "labelFontSize": 13,
+    "titleFontSize": 14,
+    "labelColor": "white",
+    "titleColor": "white"
+}
+GRID_AXIS_STYLE = {**AXIS_STYLE, "gridColor": "rgba(128, 128, 128, 0.3)", "grid": True}
+REQUIRED_COLUMNS = [
+    "Area", "Neighborhood", "Start Date - Local",
+    "Sessions", "Rides", "Active Vehicles", "Urgent Vehicles"
+]
 
 # ==============================
 # PAGE CONFIG
@@ -92,14 +113,54 @@ st.markdown("### Real-time insights into fulfillment performance and vehicle uti
 # HELPER FUNCTIONS
 # ==============================
 
+def read_excel_bytes(content):
+    """Reads Excel bytes with the calamine engine when installed, else pandas' default."""
+    try:
+        return pd.read_excel(BytesIO(content), engine="calamine")
+    except ImportError:
+        return pd.read_excel(BytesIO(content))
+
+
+def read_csv_bytes(content):
+    """Reads the columns process_data uses from CSV bytes, with PyArrow's multithreaded parser when available."""
+    # pyarrow selects columns by exact name, so resolve them from the header first
+    header = pd.read_csv(BytesIO(content), nrows=0).columns
+    usecols = [col for col in header if col.strip() in REQUIRED_COLUMNS]
+    try:
+        from pyarrow import csv as pa_csv, string as pa_string
+        # Timestamps stay text for process_data: pyarrow's inference would turn offset-bearing local times
+        # into UTC, and pandas' engine="pyarrow" only applies dtype= after that, so set the type here
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=usecols,
+            column_types={col: pa_string() for col in usecols if col.strip() == "Start Date - Local"},
+            strings_can_be_null=True
+        )
+        return pa_csv.read_csv(BytesIO(content), convert_options=convert_options).to_pandas()
+    except (ImportError, ValueError):
+        return pd.read_csv(BytesIO(content), usecols=usecols)
+
+
+@st.cache_resource
+def get_http_session():
+    """Shared keep-alive session so repeat API fetches reuse the TLS connection."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=2))
+    return session
+
+
 @st.cache_data(ttl=3600)
-def fetch_heat_data(api_token, start_date_str, end_date_str, group_by="neighborhood"):
-    """Fetches data from Rabbit API with error handling."""
+def fetch_heat_response(api_token, start_date_str, end_date_str, group_by="neighborhood"):
+    """Fetches the raw export from Rabbit API as (content type, body bytes).
+
+    Failures raise (requests exceptions, HTTPError for non-200 replies) so they are never cached.
+    """
     url = "https://dashboard.rabbit-api.app/export"
     
     headers = {
         "Authorization": f"Bearer {api_token}",
-        "Content-Type": "application/json"
+        "Content-Type": "application/json",
+        # CSV parses far faster than the xlsx export; other formats stay accepted as fallbacks
+        "Accept": "text/csv, application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;q=0.9, application/json;q=0.8"
     }
 
     filters_payload = {
@@ -114,28 +175,105 @@ def fetch_heat_data(api_token, start_date_str, end_date_str, group_by="neighborh
         "filters": json.dumps(filters_payload)
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        
-        if response.status_code != 200:
-            st.error(f"❌ API Error {response.status_code}: {response.text}")
-            return None
+    response = get_http_session().post(url, headers=headers, json=payload, timeout=30)
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(response=response)
 
-        content_type = response.headers.get("Content-Type", "")
+    return response.headers.get("Content-Type", ""), response.content
 
-        if "application/vnd.openxmlformats" in content_type:
-            return pd.read_excel(BytesIO(response.content))
-        elif "csv" in content_type:
-            return pd.read_csv(BytesIO(response.content))
-        else:
-            return pd.DataFrame(response.json())
-        
+
+@st.cache_data(ttl=3600)
+def parse_heat_response(content_type, content):
+    """Parses an API export body; cached on the bytes so parser changes don't refetch."""
+    if "application/vnd.openxmlformats" in content_type:
+        return read_excel_bytes(content)
+    elif "csv" in content_type:
+        return read_csv_bytes(content)
+    else:
+        return pd.DataFrame(json.loads(content))
+
+
+@st.cache_data(persist="disk", max_entries=400)
+def fetch_settled_heat_data(api_token, start_date_str, end_date_str):
+    """Fetches a window whose data can no longer change, persisted to disk so restarts skip the API.
+
+    Errors propagate, so a failed window is never written to the disk cache.
+    """
+    return parse_heat_response(*fetch_heat_response(api_token, start_date_str, end_date_str))
+
+
+def fetch_heat_data(api_token, start_date_str, end_date_str, settled=False):
+    """Fetches and parses one window from Rabbit API; shows the error and returns None on failure.
+
+    Errors are only reported here, outside the cached layers, so the next click retries the API.
+    """
+    try:
+        if settled:
+            return fetch_settled_heat_data(api_token, start_date_str, end_date_str)
+        return parse_heat_response(*fetch_heat_response(api_token, start_date_str, end_date_str))
     except requests.exceptions.Timeout:
         st.error("❌ Request timed out. Please try again.")
-        return None
-    except Exception as e:
+    except requests.exceptions.HTTPError as e:
+        st.error(f"❌ API Error {e.response.status_code}: {e.response.text}")
+    except requests.exceptions.RequestException as e:
         st.error(f"❌ Connection Error: {e}")
+    except Exception as e:
+        st.error(f"❌ Could not read API response: {e}")
+    return None
+
+
+def fetch_windows(start_date, end_date):
+    """Splits a date range into (first day, last day) request windows.
+
+    Short ranges go day by day so overlapping ranges reuse cached days; longer ones
+    go by calendar month to bound the number of API calls.
+    """
+    days = pd.date_range(start_date, end_date)
+    if len(days) <= DAILY_FETCH_MAX_DAYS:
+        return [(day, day) for day in days.date]
+    months = pd.Series(days.date, index=days.to_period("M"))
+    return [(group.iloc[0], group.iloc[-1]) for _, group in months.groupby(level=0)]
+
+
+def fetch_heat_data_range(api_token, start_date, end_date):
+    """Fetches a date range in cached day (or month) windows.
+
+    Uncached windows are requested in parallel; returns None if any window fails.
+    """
+    ctx = get_script_run_ctx()
+    # Days before yesterday are final (the API's UTC day can trail the local one)
+    settled_before = datetime.date.today() - datetime.timedelta(days=1)
+
+    def fetch_window(window):
+        first_day, last_day = window
+        return fetch_heat_data(
+            api_token,
+            f"{first_day}T00:00:00.000Z",
+            f"{last_day}T23:59:59.999Z",
+            settled=last_day < settled_before
+        )
+
+    # Worker threads need the script context to report API errors on the page
+    with ThreadPoolExecutor(
+        max_workers=FETCH_WORKERS,
+        initializer=lambda: add_script_run_ctx(ctx=ctx)
+    ) as pool:
+        frames = list(pool.map(fetch_window, fetch_windows(start_date, end_date)))
+
+    if any(frame is None for frame in frames):
         return None
+    return pd.concat(frames, ignore_index=True)
+
+
+@st.cache_data(persist="disk", max_entries=20)
+def load_uploaded_file(file_bytes, file_name):
+    """Parses an uploaded Excel or CSV file, keyed on its contents.
+
+    Persisted to disk so a server restart doesn't re-parse a large workbook.
+    """
+    if file_name.endswith(".csv"):
+        return read_csv_bytes(file_bytes)
+    return read_excel_bytes(file_bytes)
 
 
 def get_time_interval(hour):
@@ -148,18 +286,22 @@ def get_time_interval(hour):
         return "Evening/Night (6p-6a)"
 
 
+def hour_to_interval(hour):
+    """Maps hours of day to an ordered INTERVAL_ORDER categorical without building per-row labels."""
+    return pd.Categorical.from_codes(
+        np.select([hour.between(6, 11), hour.between(12, 17)], [0, 1], default=2),
+        categories=INTERVAL_ORDER,
+        ordered=True
+    )
+
+
 @st.cache_data(ttl=3600)
 def process_data(df):
     """Standardizes column names and parses dates."""
     df_copy = df.copy()
     df_copy.columns = df_copy.columns.str.strip()
     
-    required_cols = [
-        "Area", "Neighborhood", "Start Date - Local",
-        "Sessions", "Rides", "Active Vehicles", "Urgent Vehicles"
-    ]
-    
-    missing_cols = [col for col in required_cols if col not in df_copy.columns]
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df_copy.columns]
     if missing_cols:
         st.error(f"❌ Missing columns: {missing_cols}")
         st.info(f"Available columns: {list(df_copy.columns)}")
@@ -174,55 +316,189 @@ def process_data(df):
         st.error("❌ Failed to parse dates. Please check date format.")
         return None
     
-    df_copy["_hour"] = df_copy["Start Date - Local"].dt.hour
-    df_copy["_date"] = df_copy["Start Date - Local"].dt.date.astype(str)
-    df_copy["_time_interval"] = df_copy["_hour"].apply(get_time_interval)
+    # Counts fit comfortably in int32, which halves the memory the groupby sums stream through
+    for col in ["Sessions", "Rides", "Active Vehicles", "Urgent Vehicles"]:
+        values = pd.to_numeric(df_copy[col], errors="coerce", downcast="integer")
+        if values.dtype.kind == "i" and values.dtype.itemsize < 4:
+            values = values.astype("int32")
+        df_copy[col] = values
+
+    # Group keys as categoricals: groupbys and equality filters then work on int codes
+    df_copy["Area"] = df_copy["Area"].astype("category")
+    df_copy["Neighborhood"] = df_copy["Neighborhood"].astype("category")
+
+    # Resolved once per upload (on the categories, not the rows) so filtering is a plain mask
+    no_neighborhood_codes = np.flatnonzero(
+        df_copy["Neighborhood"].cat.categories.str.lower() == "no neighborhood"
+    )
+    df_copy["_has_neighborhood"] = ~df_copy["Neighborhood"].cat.codes.isin(no_neighborhood_codes)
+
+    # Snapshot ids: counting distinct small ints is cheaper than hashing timestamps
+    snap_codes, _ = pd.factorize(df_copy["Start Date - Local"])
+    df_copy["_snap"] = pd.Series(snap_codes, index=df_copy.index, dtype="Int32").mask(snap_codes < 0)
+
+    hour = df_copy["Start Date - Local"].dt.hour
+    # int8 unless unparsed timestamps left NaN hours behind
+    df_copy["_hour"] = hour.astype("int8") if hour.notna().all() else hour
+    # Format each distinct day once instead of building a Python date object per row
+    df_copy["_date"] = (
+        df_copy["Start Date - Local"].dt.normalize()
+        .astype("category")
+        .cat.rename_categories(lambda d: str(d.date()))
+    )
 
     return df_copy
 
 
-@st.cache_data(ttl=3600)
+def safe_divide(numerator, denominator):
+    """Element-wise division in one pass, returning 0 where the denominator is not positive."""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
 def calculate_metrics(df_grouped, time_column):
     """Calculates fulfillment, utilization, and average vehicle metrics."""
     agg_df = (
-        df_grouped.groupby(["Neighborhood", time_column])
+        df_grouped.groupby(["Neighborhood", time_column], observed=True)
         .agg({
             "Sessions": "sum",
             "Active Vehicles": "sum",
             "Urgent Vehicles": "sum",
             "Rides": "sum",
-            "Start Date - Local": "nunique" 
+            "_snap": "nunique" 
         })
-        .rename(columns={"Start Date - Local": "Snapshots"})
+        .rename(columns={"_snap": "Snapshots"})
+        .astype({"Snapshots": "int32"})
         .reset_index()
     )
+    return add_rate_metrics(agg_df)
 
-    agg_df["Neighborhood Fulfillment Rate"] = np.where(
-        agg_df["Sessions"] > 0,
-        agg_df["Rides"] / agg_df["Sessions"],
-        0
+
+def rollup_to_intervals(df_hourly):
+    """Derives the interval metrics from the hourly ones instead of rescanning the rows.
+
+    Every snapshot falls in exactly one hour, so summing the hourly Snapshots is lossless.
+    """
+    counts = ["Sessions", "Active Vehicles", "Urgent Vehicles", "Rides", "Snapshots"]
+    agg_df = (
+        df_hourly.assign(_time_interval=hour_to_interval(df_hourly["_hour"]))
+        .groupby(["Neighborhood", "_time_interval"], observed=True)[counts]
+        .sum()
+        .reset_index()
     )
+    return add_rate_metrics(agg_df)
+
+
+def add_rate_metrics(agg_df):
+    """Adds fulfillment, utilization, and average vehicle columns to summed counts."""
+    agg_df["Neighborhood Fulfillment Rate"] = safe_divide(agg_df["Rides"], agg_df["Sessions"])
     agg_df["Missed Opportunity"] = agg_df["Sessions"] - agg_df["Rides"]
-    agg_df["Active (Avg)"] = np.where(
-        agg_df["Snapshots"] > 0, 
-        agg_df["Active Vehicles"] / agg_df["Snapshots"], 
-        0
-    )
-    agg_df["Urgent (Avg)"] = np.where(
-        agg_df["Snapshots"] > 0, 
-        agg_df["Urgent Vehicles"] / agg_df["Snapshots"], 
-        0
-    )
-    agg_df["Utilization"] = np.where(
-        agg_df["Active (Avg)"] > 0, 
-        agg_df["Rides"] / agg_df["Active (Avg)"], 
-        0
-    )
+    agg_df["Active (Avg)"] = safe_divide(agg_df["Active Vehicles"], agg_df["Snapshots"])
+    agg_df["Urgent (Avg)"] = safe_divide(agg_df["Urgent Vehicles"], agg_df["Snapshots"])
+    agg_df["Utilization"] = safe_divide(agg_df["Rides"], agg_df["Active (Avg)"])
     agg_df["Utilization"] = agg_df["Utilization"].replace([np.nan, np.inf], 0)
     
     return agg_df
 
 
+@st.cache_resource(max_entries=10)
+def area_row_positions(_df, data_key):
+    """Row positions of each Area in the loaded dataset, built once per load.
+
+    Held as a resource so reruns reuse the arrays instead of unpickling copies.
+    """
+    return _df.groupby("Area", observed=True).indices
+
+
+@st.cache_data(ttl=3600, max_entries=50)
+def build_aggregations(_df_filtered, data_key, area, dates):
+    """Hourly and interval metrics for one filter selection, cached on primitive keys.
+
+    The filtered frame itself is not hashed; data_key identifies the loaded dataset.
+    Also returns the aggregate demand lines for each time dimension.
+    """
+    df_hourly = calculate_metrics(_df_filtered, "_hour")
+    df_interval = rollup_to_intervals(df_hourly)
+    demand_long = {
+        "_hour": build_demand_long(df_hourly, "_hour"),
+        "_time_interval": build_demand_long(df_interval, "_time_interval")
+    }
+    return df_hourly, df_interval, demand_long
+
+
+def build_demand_long(agg_df, time_dim):
+    """Area-wide demand totals per time period in long form (one row per metric)."""
+    dynamic_total = agg_df.groupby(time_dim, observed=True).agg(
+        Rides=("Rides", "sum"),
+        Sessions=("Sessions", "sum"),
+        Urgent_Vehicles=("Urgent (Avg)", "sum")
+    ).reset_index()
+
+    # Stacked straight from the column arrays rather than melted
+    return pd.DataFrame({
+        time_dim: pd.concat([dynamic_total[time_dim]] * len(DEMAND_METRICS), ignore_index=True),
+        "Metric": np.repeat(DEMAND_METRICS, len(dynamic_total)),
+        "Count": np.concatenate([dynamic_total[m].to_numpy(dtype=float) for m in DEMAND_METRICS]),
+    })
+
+
+@st.cache_data(ttl=3600)
+def recommend_vehicles_by_period(agg_df, time_column, confidence_threshold, total_fleet_size):
+    """Scores neighborhoods within every time period and splits the fleet per period."""
+    rate = agg_df["Neighborhood Fulfillment Rate"]
+    sessions = agg_df["Sessions"]
+    unmet = agg_df["Missed Opportunity"]
+    active = agg_df["Active (Avg)"]
+    reliable = rate >= (confidence_threshold / 100)
+
+    scores = pd.DataFrame({
+        "Neighborhood": agg_df["Neighborhood"],
+        "Time_Period": agg_df[time_column],
+        "Demand_Score": sessions,
+        "Reliability_Score": np.where(reliable, rate * 100, rate * 50),
+        "Unmet_Demand": unmet,
+        "Demand_Density": np.where(active > 0, sessions / active, sessions),
+    })
+
+    def per_period(column, how):
+        # Only broadcasts back to rows, so skip sorting the period keys
+        return scores[column].groupby(scores["Time_Period"], observed=True, sort=False).transform(how)
+
+    scores["Growth_Potential"] = np.where(
+        (scores["Demand_Density"] > per_period("Demand_Density", "median")) & reliable,
+        unmet * 1.5,
+        unmet
+    )
+    scores["Allocation_Score"] = (
+        (scores["Demand_Score"] / per_period("Demand_Score", "max") * 40) +
+        (scores["Reliability_Score"] / 100 * 25) +
+        (scores["Unmet_Demand"] / per_period("Unmet_Demand", "max") * 20) +
+        (scores["Growth_Potential"] / per_period("Growth_Potential", "max") * 15)
+    )
+    total_score = per_period("Allocation_Score", "sum")
+    scores["Recommended_Vehicles"] = np.floor(
+        (scores["Allocation_Score"] / total_score) * total_fleet_size
+    ).astype(int)
+
+    return (
+        scores[["Neighborhood", "Time_Period", "Recommended_Vehicles"]]
+        .sort_values("Time_Period", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+@st.cache_data(ttl=3600)
+def to_csv_bytes(df):
+    """Encodes a frame as UTF-8 CSV, memoized so repeat downloads skip re-serializing."""
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def csv_download(df):
+    """Defers CSV encoding for st.download_button until the button is clicked."""
+    return lambda: to_csv_bytes(df)
+
+
 def validate_date_range(start_date, end_date):
     """Validates that date range is sensible."""
     if start_date > end_date:
@@ -257,6 +533,51 @@ def get_aggregation_for_granularity(granularity, df_hourly, df_interval):
     }
 
 
+def heatmap_spec(agg_config, color, tooltip):
+    """Builds a Vega-Lite heatmap spec of Neighborhood by time period as a plain dict."""
+    time_dim = agg_config["time_dim"]
+    return {
+        "mark": {"type": "rect", "strokeWidth": 2, "stroke": "#1a1a1a"},
+        "encoding": {
+            "x": {
+                "field": time_dim,
+                "type": "ordinal",
+                "title": agg_config["time_title"],
+                "sort": agg_config["time_sort"],
+                "axis": {"labelAngle": -45, **AXIS_STYLE}
+            },
+            "y": {
+                "field": "Neighborhood",
+                "type": "ordinal",
+                "title": "Neighborhood",
+                "axis": AXIS_STYLE
+            },
+            "color": color,
+            "tooltip": [
+                {"field": "Neighborhood", "type": "nominal", "title": "Neighborhood"},
+                {"field": time_dim, "type": "ordinal", "title": agg_config["time_title"]},
+                *tooltip
+            ]
+        },
+        "height": max(MIN_CHART_HEIGHT, agg_config["df"]["Neighborhood"].nunique() * PIXELS_PER_NEIGHBORHOOD),
+        "config": CHART_CONFIG
+    }
+
+
+def legend_highlight(field, stroke_width):
+    """Vega-Lite param and encodings that dim every series except the one clicked in the legend."""
+    param = {
+        "name": "legend_pick",
+        "select": {"type": "point", "fields": [field], "on": "click"},
+        "bind": "legend"
+    }
+    encoding = {
+        "opacity": {"condition": {"param": "legend_pick", "value": 1}, "value": 0.2},
+        "strokeWidth": {"condition": {"param": "legend_pick", "value": stroke_width}, "value": 2}
+    }
+    return [param], encoding
+
+
 # ==============================
 # SESSION STATE
 # ==============================
@@ -308,16 +629,13 @@ with st.sidebar:
         
         if st.button("🚀 Fetch Data", type="primary", disabled=button_disabled, use_container_width=True):
             with st.spinner("Fetching and processing data..."):
-                raw_df = fetch_heat_data(
-                    api_token, 
-                    f"{start_d}T00:00:00.000Z", 
-                    f"{end_d}T23:59:00.000Z"
-                )
+                raw_df = fetch_heat_data_range(api_token, start_d, end_d)
                 if raw_df is not None:
                     if not raw_df.empty:
                         processed = process_data(raw_df)
                         if processed is not None:
                             st.session_state.data = processed
+                            st.session_state.data_key = uuid.uuid4().hex
                             st.success(f"✅ Loaded {len(raw_df):,} rows!")
                             st.rerun()
                     else:
@@ -329,16 +647,20 @@ with st.sidebar:
             "Choose Excel or CSV file:", 
             type=["xlsx", "xls", "csv"]
         )
-        if uploaded_file:
+        # Only parse when a new file arrives; otherwise every rerun would re-read and rerun again.
+        is_new_upload = uploaded_file and (
+            st.session_state.data is None
+            or st.session_state.get("uploaded_file_id") != uploaded_file.file_id
+        )
+        if is_new_upload:
             try:
-                if uploaded_file.name.endswith(".csv"):
-                    raw_df = pd.read_csv(uploaded_file)
-                else:
-                    raw_df = pd.read_excel(uploaded_file)
+                raw_df = load_uploaded_file(uploaded_file.getvalue(), uploaded_file.name)
                 
                 processed = process_data(raw_df)
                 if processed is not None:
                     st.session_state.data = processed
+                    st.session_state.uploaded_file_id = uploaded_file.file_id
+                    st.session_state.data_key = uuid.uuid4().hex
                     st.success(f"✅ Loaded {len(raw_df):,} rows!")
                     st.rerun()
                 
@@ -383,8 +705,9 @@ st.markdown("## 🔍 Filters")
 
 col1, col2, col3 = st.columns([2, 3, 2])
 
-areas = sorted(df["Area"].dropna().unique().tolist())
-dates = sorted(df["_date"].dropna().unique().tolist())
+# Both are categoricals built from the data, so their categories are the sorted distinct values
+areas = df["Area"].cat.categories.tolist()
+dates = df["_date"].cat.categories.tolist()
 
 with col1:
     selected_area = st.selectbox(
@@ -403,11 +726,10 @@ with col2:
 with col3:
     st.markdown("##### Quick Actions")
 
-df_filtered = df[
-    (df["Area"] == selected_area) & 
-    (df["_date"].isin(selected_dates)) &
-    (df["Neighborhood"].str.lower() != "no neighborhood")
-]
+# Jump straight to the selected area's rows, then mask only those
+area_rows = area_row_positions(df, st.session_state.data_key)
+df_area = df.iloc[area_rows.get(selected_area, [])]
+df_filtered = df_area[df_area["_date"].isin(selected_dates) & df_area["_has_neighborhood"]]
 
 if df_filtered.empty:
     st.warning("⚠️ No data available for selected filters. Try different criteria.")
@@ -416,28 +738,28 @@ if df_filtered.empty:
 # ==============================
 # DATA PREPARATION
 # ==============================
-df_hourly_agg = calculate_metrics(df_filtered, "_hour")
-df_interval_agg = calculate_metrics(df_filtered, "_time_interval")
-
-df_interval_agg["_time_interval"] = pd.Categorical(
-    df_interval_agg["_time_interval"], 
-    categories=INTERVAL_ORDER, 
-    ordered=True
+df_hourly_agg, df_interval_agg, demand_long_by_dim = build_aggregations(
+    df_filtered,
+    st.session_state.data_key,
+    selected_area,
+    tuple(sorted(selected_dates))
 )
 
-daily_active_avg = (
-    df_filtered.groupby(["Neighborhood", "_date"])["Active Vehicles"]
-    .mean()
-    .reset_index()
-    .rename(columns={"Active Vehicles": "Daily Active Avg"})
-)
-period_active_avg = (
-    daily_active_avg.groupby("Neighborhood")["Daily Active Avg"]
-    .mean()
-    .reset_index()
-    .rename(columns={"Daily Active Avg": "Active (Avg)"})
+# One pass over the filtered rows per (neighborhood, day); the period roll-up then
+# only touches the small daily table.
+# _has_neighborhood only drops rows labelled "No Neighborhood"; rows with a blank Neighborhood cell
+# pass that filter, and dropna=False keeps them in the per-day totals used by the trend analysis
+daily_summary = df_filtered.groupby(["Neighborhood", "_date"], observed=True, dropna=False).agg(
+    Rides=("Rides", "sum"),
+    Sessions=("Sessions", "sum"),
+    Daily_Active_Avg=("Active Vehicles", "mean"),
 )
-total_avg_active_scooters = period_active_avg["Active (Avg)"].sum()
+period_summary = daily_summary.groupby(level="Neighborhood", observed=True).agg(
+    Rides=("Rides", "sum"),
+    Sessions=("Sessions", "sum"),
+    **{"Active (Avg)": ("Daily_Active_Avg", "mean")},
+).reset_index()
+total_avg_active_scooters = period_summary["Active (Avg)"].sum()
 
 # Download buttons
 if selected_dates:
@@ -445,14 +767,14 @@ if selected_dates:
         with st.expander("📥 Download Data"):
             st.download_button(
                 label="📊 Hourly Data",
-                data=df_hourly_agg.to_csv(index=False).encode('utf-8'),
+                data=csv_download(df_hourly_agg),
                 file_name=f'hourly_{selected_area}.csv',
                 mime='text/csv',
                 use_container_width=True
             )
             st.download_button(
                 label="⏰ Interval Data",
-                data=df_interval_agg.to_csv(index=False).encode('utf-8'),
+                data=csv_download(df_interval_agg),
                 file_name=f'interval_{selected_area}.csv',
                 mime='text/csv',
                 use_container_width=True
@@ -509,25 +831,12 @@ st.markdown("---")
 st.markdown("## 🏆 Neighborhood Performance Leaderboard")
 st.caption("Rankings based on Rides Per Day Per Vehicle (RPDPV)")
 
-period_summary = df_filtered.groupby("Neighborhood").agg(
-    Rides=("Rides", "sum"),
-    Sessions=("Sessions", "sum"),
-).reset_index()
-
-agg = pd.merge(period_summary, period_active_avg, on="Neighborhood")
+agg = period_summary.copy()
 num_selected_days = len(df_filtered["_date"].unique())
 agg["Rides per Day"] = agg["Rides"] / num_selected_days
-agg["RPDPV"] = np.where(
-    agg["Active (Avg)"] > 0, 
-    agg["Rides per Day"] / agg["Active (Avg)"], 
-    0
-)
+agg["RPDPV"] = safe_divide(agg["Rides per Day"], agg["Active (Avg)"])
 agg["Missed Opportunity"] = agg["Sessions"] - agg["Rides"]
-agg["Fulfillment Rate"] = np.where(
-    agg["Sessions"] > 0,
-    agg["Rides"] / agg["Sessions"] * 100,
-    0
-)
+agg["Fulfillment Rate"] = safe_divide(agg["Rides"], agg["Sessions"]) * 100
 
 st.dataframe(
     agg.sort_values("RPDPV", ascending=False),
@@ -562,381 +871,326 @@ st.markdown("---")
 # ==============================
 # 2. FULFILLMENT HEATMAP
 # ==============================
-st.markdown("## 🔥 Fulfillment Rate Heatmap")
+@st.fragment
+def render_fulfillment_heatmap(df_hourly_agg, df_interval_agg):
+    """Fulfillment heatmap; reruns alone when its granularity changes."""
+    st.markdown("## 🔥 Fulfillment Rate Heatmap")
+
+    col_c, col_i = st.columns([2, 5])
+    with col_c:
+        chart_granularity_2 = add_granularity_control(2)
+
+    agg_config_2 = get_aggregation_for_granularity(
+        chart_granularity_2, 
+        df_hourly_agg, 
+        df_interval_agg
+    )
 
-col_c, col_i = st.columns([2, 5])
-with col_c:
-    chart_granularity_2 = add_granularity_control(2)
+    with col_i:
+        st.info("📊 Lighter colors = higher fulfillment. Identify peak performance periods.")
+
+    # Ship only the encoded columns to the browser; the heatmaps don't need the rest
+    fulfillment_data = agg_config_2["df"][[
+        "Neighborhood", agg_config_2["time_dim"], "Neighborhood Fulfillment Rate",
+        "Rides", "Sessions", "Missed Opportunity", "Active (Avg)"
+    ]]
+
+    fulfillment_spec = heatmap_spec(
+        agg_config_2,
+        color={
+            "field": "Neighborhood Fulfillment Rate",
+            "type": "quantitative",
+            "scale": {
+                "domain": [0, 0.5, 1],
+                "range": ['#8B0000', '#FF8C00', '#00FF00']
+            },
+            "legend": {
+                "title": "Fulfillment Rate",
+                "format": ".0%",
+                "orient": "right",
+                "titleFontSize": 13,
+                "labelFontSize": 12,
+                "titleColor": 'white',
+                "labelColor": 'white',
+                "gradientLength": 300
+            }
+        },
+        tooltip=[
+            {"field": "Neighborhood Fulfillment Rate", "type": "quantitative", "format": ".1%", "title": "✅ Fulfillment"},
+            {"field": "Rides", "type": "quantitative", "format": ",", "title": "🚴 Rides"},
+            {"field": "Sessions", "type": "quantitative", "format": ",", "title": "📱 Sessions"},
+            {"field": "Missed Opportunity", "type": "quantitative", "format": ",", "title": "💔 Missed"},
+            {"field": "Active (Avg)", "type": "quantitative", "format": ".1f", "title": "🚲 Vehicles"},
+        ]
+    )
 
-agg_config_2 = get_aggregation_for_granularity(
-    chart_granularity_2, 
-    df_hourly_agg, 
-    df_interval_agg
-)
+    st.vega_lite_chart(fulfillment_data, fulfillment_spec, use_container_width=True)
+    st.markdown("---")
 
-with col_i:
-    st.info("📊 Lighter colors = higher fulfillment. Identify peak performance periods.")
-
-fulfillment_chart = alt.Chart(agg_config_2["df"]).mark_rect(strokeWidth=2, stroke='#1a1a1a').encode(
-    x=alt.X(
-        f"{agg_config_2['time_dim']}:O", 
-        title=agg_config_2['time_title'], 
-        sort=agg_config_2['time_sort'],
-        axis=alt.Axis(
-            labelAngle=-45, 
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white'
-        )
-    ),
-    y=alt.Y(
-        "Neighborhood:O", 
-        title="Neighborhood",
-        axis=alt.Axis(
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white'
-        )
-    ),
-    color=alt.Color(
-        "Neighborhood Fulfillment Rate:Q",
-        scale=alt.Scale(
-            domain=[0, 0.5, 1],
-            range=['#8B0000', '#FF8C00', '#00FF00'],
-        ),
-        legend=alt.Legend(
-            title="Fulfillment Rate",
-            format=".0%",
-            orient="right",
-            titleFontSize=13,
-            labelFontSize=12,
-            titleColor='white',
-            labelColor='white',
-            gradientLength=300
-        )
-    ),
-    tooltip=[
-        alt.Tooltip("Neighborhood:N", title="Neighborhood"),
-        alt.Tooltip(f"{agg_config_2['time_dim']}:O", title=agg_config_2['time_title']),
-        alt.Tooltip("Neighborhood Fulfillment Rate:Q", format=".1%", title="✅ Fulfillment"),
-        alt.Tooltip("Rides:Q", format=",", title="🚴 Rides"),
-        alt.Tooltip("Sessions:Q", format=",", title="📱 Sessions"),
-        alt.Tooltip("Missed Opportunity:Q", format=",", title="💔 Missed"),
-        alt.Tooltip("Active (Avg):Q", format=".1f", title="🚲 Vehicles"),
-    ]
-).properties(
-    height=max(MIN_CHART_HEIGHT, len(agg_config_2["df"]["Neighborhood"].unique()) * PIXELS_PER_NEIGHBORHOOD)
-).configure_view(
-    strokeWidth=0
-).configure(
-    background='#0e1117'
-)
+render_fulfillment_heatmap(df_hourly_agg, df_interval_agg)
 
-st.altair_chart(fulfillment_chart, use_container_width=True)
-st.markdown("---")
 
 # ==============================
 # 3. MISSED OPPORTUNITY
 # ==============================
-st.markdown("## 💔 Missed Opportunity Analysis")
+@st.fragment
+def render_missed_opportunity(df_hourly_agg, df_interval_agg):
+    """Missed opportunity heatmap; reruns alone when its granularity changes."""
+    st.markdown("## 💔 Missed Opportunity Analysis")
+
+    col_c, col_i = st.columns([2, 5])
+    with col_c:
+        chart_granularity_3 = add_granularity_control(3)
+
+    agg_config_3 = get_aggregation_for_granularity(
+        chart_granularity_3,
+        df_hourly_agg,
+        df_interval_agg
+    )
 
-col_c, col_i = st.columns([2, 5])
-with col_c:
-    chart_granularity_3 = add_granularity_control(3)
+    with col_i:
+        st.info("📊 Darker red = more missed opportunities. Priority areas for improvement.")
+
+    missed_data = agg_config_3["df"][[
+        "Neighborhood", agg_config_3["time_dim"], "Missed Opportunity",
+        "Neighborhood Fulfillment Rate", "Rides", "Sessions"
+    ]]
+
+    missed_spec = heatmap_spec(
+        agg_config_3,
+        color={
+            "field": "Missed Opportunity",
+            "type": "quantitative",
+            "scale": {
+                "scheme": "reds",
+                "domainMin": 0,
+                "reverse": False
+            },
+            "legend": {
+                "title": "Missed Opps",
+                "orient": "right",
+                "titleFontSize": 13,
+                "labelFontSize": 12,
+                "titleColor": 'white',
+                "labelColor": 'white',
+                "gradientLength": 300
+            }
+        },
+        tooltip=[
+            {"field": "Missed Opportunity", "type": "quantitative", "format": ",", "title": "💔 Missed"},
+            {"field": "Neighborhood Fulfillment Rate", "type": "quantitative", "format": ".1%", "title": "✅ Fulfillment"},
+            {"field": "Rides", "type": "quantitative", "format": ",", "title": "🚴 Rides"},
+            {"field": "Sessions", "type": "quantitative", "format": ",", "title": "📱 Sessions"},
+        ]
+    )
 
-agg_config_3 = get_aggregation_for_granularity(
-    chart_granularity_3,
-    df_hourly_agg,
-    df_interval_agg
-)
+    st.vega_lite_chart(missed_data, missed_spec, use_container_width=True)
+    st.markdown("---")
 
-with col_i:
-    st.info("📊 Darker red = more missed opportunities. Priority areas for improvement.")
-
-missed_chart = alt.Chart(agg_config_3["df"]).mark_rect(strokeWidth=2, stroke='#1a1a1a').encode(
-    x=alt.X(
-        f"{agg_config_3['time_dim']}:O",
-        title=agg_config_3['time_title'],
-        sort=agg_config_3['time_sort'],
-        axis=alt.Axis(
-            labelAngle=-45, 
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white'
-        )
-    ),
-    y=alt.Y(
-        "Neighborhood:O", 
-        title="Neighborhood", 
-        axis=alt.Axis(
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white'
-        )
-    ),
-    color=alt.Color(
-        "Missed Opportunity:Q",
-        scale=alt.Scale(
-            scheme="reds", 
-            domainMin=0,
-            reverse=False
-        ),
-        legend=alt.Legend(
-            title="Missed Opps", 
-            orient="right", 
-            titleFontSize=13,
-            labelFontSize=12,
-            titleColor='white',
-            labelColor='white',
-            gradientLength=300
-        )
-    ),
-    tooltip=[
-        alt.Tooltip("Neighborhood:N", title="Neighborhood"),
-        alt.Tooltip(f"{agg_config_3['time_dim']}:O", title=agg_config_3['time_title']),
-        alt.Tooltip("Missed Opportunity:Q", format=",", title="💔 Missed"),
-        alt.Tooltip("Neighborhood Fulfillment Rate:Q", format=".1%", title="✅ Fulfillment"),
-        alt.Tooltip("Rides:Q", format=",", title="🚴 Rides"),
-        alt.Tooltip("Sessions:Q", format=",", title="📱 Sessions"),
-    ]
-).properties(
-    height=max(MIN_CHART_HEIGHT, len(agg_config_3["df"]["Neighborhood"].unique()) * PIXELS_PER_NEIGHBORHOOD)
-).configure_view(
-    strokeWidth=0
-).configure(
-    background='#0e1117'
-)
+render_missed_opportunity(df_hourly_agg, df_interval_agg)
 
-st.altair_chart(missed_chart, use_container_width=True)
-st.markdown("---")
 
 # ==============================
 # 4. FULFILLMENT TRENDS
 # ==============================
-st.markdown("## 📈 Fulfillment Trends by Neighborhood")
+@st.fragment
+def render_fulfillment_trends(df_hourly_agg, df_interval_agg):
+    """Fulfillment trend lines; granularity and neighborhood picks rerun only this section."""
+    st.markdown("## 📈 Fulfillment Trends by Neighborhood")
+
+    col_c, col_i = st.columns([2, 5])
+    with col_c:
+        chart_granularity_4 = add_granularity_control(4)
+
+    agg_config_4 = get_aggregation_for_granularity(
+        chart_granularity_4,
+        df_hourly_agg,
+        df_interval_agg
+    )
 
-col_c, col_i = st.columns([2, 5])
-with col_c:
-    chart_granularity_4 = add_granularity_control(4)
+    with col_i:
+        st.info("📊 Compare fulfillment patterns. Look for consistent performers vs volatility.")
+    
+        # Debug expander to see data stats
+        with st.expander("🔍 Debug: View Data Summary"):
+            st.write(f"**Total data points:** {len(agg_config_4['df'])}")
+            st.write(f"**Unique neighborhoods:** {agg_config_4['df']['Neighborhood'].nunique()}")
+            st.write(f"**Neighborhoods list:**")
+            st.write(sorted(agg_config_4['df']['Neighborhood'].unique().tolist()))
+            st.write(f"**Sample data:**")
+            st.dataframe(agg_config_4['df'].head(10), use_container_width=True)
+
+    # Show neighborhood selector above chart
+    neighborhoods_in_chart = sorted(agg_config_4["df"]["Neighborhood"].unique())
+    st.markdown(f"**{len(neighborhoods_in_chart)} neighborhoods** in this view")
+
+    selected_neighborhoods = st.multiselect(
+        "Filter by neighborhoods (leave empty to show all):",
+        options=neighborhoods_in_chart,
+        default=[],
+        key="trend_neighborhood_filter"
+    )
 
-agg_config_4 = get_aggregation_for_granularity(
-    chart_granularity_4,
-    df_hourly_agg,
-    df_interval_agg
-)
+    # Filter data if neighborhoods are selected
+    if selected_neighborhoods:
+        trend_data = agg_config_4["df"][agg_config_4["df"]["Neighborhood"].isin(selected_neighborhoods)]
+    else:
+        trend_data = agg_config_4["df"]
+
+    trend_data = trend_data[[
+        "Neighborhood", agg_config_4["time_dim"], "Neighborhood Fulfillment Rate", "Rides", "Sessions"
+    ]]
+
+    # Click a legend entry to highlight that neighborhood
+    trend_params, trend_highlight = legend_highlight("Neighborhood", stroke_width=5)
+
+    trend_spec = {
+        "mark": {
+            "type": "line",
+            "point": {"size": 120, "filled": True, "opacity": 1},
+            "strokeWidth": 5,
+            "opacity": 1
+        },
+        "params": trend_params,
+        "encoding": {
+            "x": {
+                "field": agg_config_4["time_dim"],
+                "type": "ordinal",
+                "title": agg_config_4["time_title"],
+                "sort": agg_config_4["time_sort"],
+                "axis": {"labelAngle": -45, **GRID_AXIS_STYLE}
+            },
+            "y": {
+                "field": "Neighborhood Fulfillment Rate",
+                "type": "quantitative",
+                "title": "Fulfillment Rate",
+                "axis": {"format": ".0%", **GRID_AXIS_STYLE},
+                "scale": {"domain": [0, 1]}
+            },
+            "color": {
+                "field": "Neighborhood",
+                "type": "nominal",
+                "scale": {"scheme": "category20"},
+                "legend": {
+                    "titleFontSize": 12,
+                    "labelFontSize": 11,
+                    "titleColor": "white",
+                    "labelColor": "white",
+                    "symbolSize": 200,
+                    "symbolStrokeWidth": 3,
+                    "title": "Neighborhood (Click to filter)",
+                    "orient": "right",
+                    "columns": 1,
+                    "labelLimit": 200
+                }
+            },
+            **trend_highlight,
+            "tooltip": [
+                {"field": "Neighborhood", "type": "nominal", "title": "Neighborhood"},
+                {"field": agg_config_4["time_dim"], "type": "ordinal", "title": agg_config_4["time_title"]},
+                {"field": "Neighborhood Fulfillment Rate", "type": "quantitative", "format": ".1%", "title": "✅ Fulfillment"},
+                {"field": "Rides", "type": "quantitative", "format": ",", "title": "🚴 Rides"},
+                {"field": "Sessions", "type": "quantitative", "format": ",", "title": "📱 Sessions"},
+            ]
+        },
+        "width": "container",
+        "height": 550,
+        "config": CHART_CONFIG
+    }
 
-with col_i:
-    st.info("📊 Compare fulfillment patterns. Look for consistent performers vs volatility.")
-    
-    # Debug expander to see data stats
-    with st.expander("🔍 Debug: View Data Summary"):
-        st.write(f"**Total data points:** {len(agg_config_4['df'])}")
-        st.write(f"**Unique neighborhoods:** {agg_config_4['df']['Neighborhood'].nunique()}")
-        st.write(f"**Neighborhoods list:**")
-        st.write(sorted(agg_config_4['df']['Neighborhood'].unique().tolist()))
-        st.write(f"**Sample data:**")
-        st.dataframe(agg_config_4['df'].head(10), use_container_width=True)
-
-# Show neighborhood selector above chart
-neighborhoods_in_chart = sorted(agg_config_4["df"]["Neighborhood"].unique())
-st.markdown(f"**{len(neighborhoods_in_chart)} neighborhoods** in this view")
-
-selected_neighborhoods = st.multiselect(
-    "Filter by neighborhoods (leave empty to show all):",
-    options=neighborhoods_in_chart,
-    default=[],
-    key="trend_neighborhood_filter"
-)
+    st.caption("💡 **Tip:** Use the dropdown above to filter specific neighborhoods, or click legend items to highlight")
 
-# Filter data if neighborhoods are selected
-if selected_neighborhoods:
-    trend_data = agg_config_4["df"][agg_config_4["df"]["Neighborhood"].isin(selected_neighborhoods)]
-else:
-    trend_data = agg_config_4["df"]
-
-# Create selection for interactivity
-selection = alt.selection_point(fields=['Neighborhood'], bind='legend', on='click')
-
-trend_chart = alt.Chart(trend_data).mark_line(
-    point=alt.OverlayMarkDef(size=120, filled=True, opacity=1),
-    strokeWidth=5,
-    opacity=1
-).encode(
-    x=alt.X(
-        f"{agg_config_4['time_dim']}:O",
-        title=agg_config_4['time_title'],
-        sort=agg_config_4['time_sort'],
-        axis=alt.Axis(
-            labelAngle=-45, 
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white',
-            gridColor='rgba(128, 128, 128, 0.3)',
-            grid=True
-        )
-    ),
-    y=alt.Y(
-        "Neighborhood Fulfillment Rate:Q",
-        title="Fulfillment Rate",
-        axis=alt.Axis(
-            format=".0%", 
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white',
-            gridColor='rgba(128, 128, 128, 0.3)',
-            grid=True
-        ),
-        scale=alt.Scale(domain=[0, 1])
-    ),
-    color=alt.Color(
-        "Neighborhood:N", 
-        scale=alt.Scale(scheme='category20'),
-        legend=alt.Legend(
-            titleFontSize=12,
-            labelFontSize=11,
-            titleColor='white',
-            labelColor='white',
-            symbolSize=200,
-            symbolStrokeWidth=3,
-            title="Neighborhood (Click to filter)",
-            orient='right',
-            columns=1,
-            labelLimit=200
-        )
-    ),
-    opacity=alt.condition(selection, alt.value(1), alt.value(0.2)),
-    strokeWidth=alt.condition(selection, alt.value(5), alt.value(2)),
-    tooltip=[
-        alt.Tooltip("Neighborhood:N", title="Neighborhood"),
-        alt.Tooltip(f"{agg_config_4['time_dim']}:O", title=agg_config_4['time_title']),
-        alt.Tooltip("Neighborhood Fulfillment Rate:Q", format=".1%", title="✅ Fulfillment"),
-        alt.Tooltip("Rides:Q", format=",", title="🚴 Rides"),
-        alt.Tooltip("Sessions:Q", format=",", title="📱 Sessions"),
-    ]
-).add_params(
-    selection
-).properties(
-    width='container',
-    height=550
-).configure_view(
-    strokeWidth=0
-).configure(
-    background='#0e1117'
-)
+    st.vega_lite_chart(trend_data, trend_spec, use_container_width=True)
+    st.markdown("---")
 
-st.caption("💡 **Tip:** Use the dropdown above to filter specific neighborhoods, or click legend items to highlight")
+render_fulfillment_trends(df_hourly_agg, df_interval_agg)
 
-st.altair_chart(trend_chart, use_container_width=True)
-st.markdown("---")
 
 # ==============================
 # 5. AGGREGATE DEMAND
 # ==============================
-st.markdown("## 📊 Aggregate Demand Patterns")
-
-col_c, col_i = st.columns([2, 5])
-with col_c:
-    chart_granularity_5 = add_granularity_control(5)
-
-agg_config_5 = get_aggregation_for_granularity(
-    chart_granularity_5,
-    df_hourly_agg,
-    df_interval_agg
-)
-
-with col_i:
-    st.info("📊 Overall demand patterns and urgent vehicle needs. Spot peak times.")
+@st.fragment
+def render_aggregate_demand(df_hourly_agg, df_interval_agg, demand_long_by_dim):
+    """Aggregate demand lines; reruns alone when its granularity changes."""
+    st.markdown("## 📊 Aggregate Demand Patterns")
+
+    col_c, col_i = st.columns([2, 5])
+    with col_c:
+        chart_granularity_5 = add_granularity_control(5)
+
+    agg_config_5 = get_aggregation_for_granularity(
+        chart_granularity_5,
+        df_hourly_agg,
+        df_interval_agg
+    )
 
-dynamic_total = agg_config_5["df"].groupby(agg_config_5["time_dim"]).agg(
-    Rides=("Rides", "sum"),
-    Sessions=("Sessions", "sum"),
-    Urgent_Vehicles=("Urgent (Avg)", "sum")
-).reset_index()
+    with col_i:
+        st.info("📊 Overall demand patterns and urgent vehicle needs. Spot peak times.")
+
+    dynamic_long = demand_long_by_dim[agg_config_5["time_dim"]]
+
+    # Click a legend entry to highlight that metric
+    demand_params, demand_highlight = legend_highlight("Metric", stroke_width=6)
+
+    demand_spec = {
+        "mark": {
+            "type": "line",
+            "point": {"size": 150, "filled": True, "opacity": 1},
+            "strokeWidth": 6,
+            "interpolate": "monotone",
+            "opacity": 1
+        },
+        "params": demand_params,
+        "encoding": {
+            "x": {
+                "field": agg_config_5["time_dim"],
+                "type": "ordinal",
+                "title": agg_config_5["time_title"],
+                "sort": agg_config_5["time_sort"],
+                "axis": {"labelAngle": -45, **GRID_AXIS_STYLE}
+            },
+            "y": {
+                "field": "Count",
+                "type": "quantitative",
+                "title": "Total Count",
+                "axis": GRID_AXIS_STYLE
+            },
+            "color": {
+                "field": "Metric",
+                "type": "nominal",
+                "scale": {
+                    "domain": DEMAND_METRICS,
+                    "range": ['#00D9FF', '#FF6B9D', '#FFA500']  # Bright cyan, pink, orange
+                },
+                "legend": {
+                    "titleFontSize": 13,
+                    "labelFontSize": 12,
+                    "titleColor": "white",
+                    "labelColor": "white",
+                    "symbolSize": 250,
+                    "symbolStrokeWidth": 4,
+                    "title": "Metric (Click to filter)"
+                }
+            },
+            **demand_highlight,
+            "tooltip": [
+                {"field": agg_config_5["time_dim"], "type": "ordinal", "title": agg_config_5["time_title"]},
+                {"field": "Metric", "type": "nominal", "title": "Metric"},
+                {"field": "Count", "type": "quantitative", "format": ",.1f", "title": "Count"}
+            ]
+        },
+        "height": 500,
+        "config": CHART_CONFIG
+    }
 
-dynamic_long = dynamic_total.melt(
-    id_vars=[agg_config_5["time_dim"]],
-    value_vars=["Rides", "Sessions", "Urgent_Vehicles"],
-    var_name="Metric",
-    value_name="Count"
-)
+    st.caption("💡 **Tip:** Click on metric names in the legend to highlight specific metrics")
 
-# Create selection for demand chart
-demand_selection = alt.selection_point(fields=['Metric'], bind='legend', on='click')
-
-demand_chart = alt.Chart(dynamic_long).mark_line(
-    point=alt.OverlayMarkDef(size=150, filled=True, opacity=1),
-    strokeWidth=6,
-    interpolate='monotone',
-    opacity=1
-).encode(
-    x=alt.X(
-        f"{agg_config_5['time_dim']}:O",
-        title=agg_config_5['time_title'],
-        sort=agg_config_5['time_sort'],
-        axis=alt.Axis(
-            labelAngle=-45, 
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white',
-            gridColor='rgba(128, 128, 128, 0.3)',
-            grid=True
-        )
-    ),
-    y=alt.Y(
-        "Count:Q", 
-        title="Total Count", 
-        axis=alt.Axis(
-            labelFontSize=13,
-            titleFontSize=14,
-            labelColor='white',
-            titleColor='white',
-            gridColor='rgba(128, 128, 128, 0.3)',
-            grid=True
-        )
-    ),
-    color=alt.Color(
-        "Metric:N", 
-        scale=alt.Scale(
-            domain=['Rides', 'Sessions', 'Urgent_Vehicles'],
-            range=['#00D9FF', '#FF6B9D', '#FFA500']  # Bright cyan, pink, orange
-        ),
-        legend=alt.Legend(
-            titleFontSize=13,
-            labelFontSize=12,
-            titleColor='white',
-            labelColor='white',
-            symbolSize=250,
-            symbolStrokeWidth=4,
-            title="Metric (Click to filter)"
-        )
-    ),
-    opacity=alt.condition(demand_selection, alt.value(1), alt.value(0.2)),
-    strokeWidth=alt.condition(demand_selection, alt.value(6), alt.value(2)),
-    tooltip=[
-        alt.Tooltip(agg_config_5["time_dim"], title=agg_config_5['time_title']),
-        alt.Tooltip("Metric:N", title="Metric"),
-        alt.Tooltip("Count:Q", format=",.1f", title="Count")
-    ]
-).add_params(
-    demand_selection
-).properties(height=500).configure_view(
-    strokeWidth=0
-).configure(
-    background='#0e1117'
-)
+    st.vega_lite_chart(dynamic_long, demand_spec, use_container_width=True)
 
-st.caption("💡 **Tip:** Click on metric names in the legend to highlight specific metrics")
+    st.markdown("---")
 
-st.altair_chart(demand_chart, use_container_width=True)
+render_aggregate_demand(df_hourly_agg, df_interval_agg, demand_long_by_dim)
 
-st.markdown("---")
 
 # ==============================
 # 6. INSIGHTS & RECOMMENDATIONS
@@ -962,12 +1216,17 @@ with tab1:
     peak_hour = hourly_demand.loc[hourly_demand["Total_Sessions"].idxmax(), "_hour"]
     lowest_hour = hourly_demand.loc[hourly_demand["Total_Sessions"].idxmin(), "_hour"]
     
-    # Time interval analysis
-    interval_demand = df_filtered.groupby("_time_interval").agg(
-        Total_Rides=("Rides", "sum"),
-        Total_Sessions=("Sessions", "sum"),
-        Fulfillment=("Rides", "sum")
-    ).reset_index()
+    # Time interval analysis (intervals are whole hours, so roll up the hourly totals)
+    interval_demand = (
+        hourly_demand.assign(_time_interval=hourly_demand["_hour"].map(get_time_interval))
+        .groupby("_time_interval")
+        .agg(
+            Total_Rides=("Total_Rides", "sum"),
+            Total_Sessions=("Total_Sessions", "sum"),
+            Fulfillment=("Total_Rides", "sum")
+        )
+        .reset_index()
+    )
     interval_demand["Fulfillment_Rate"] = interval_demand["Total_Rides"] / interval_demand["Total_Sessions"]
     best_interval = interval_demand.loc[interval_demand["Fulfillment_Rate"].idxmax(), "_time_interval"]
     worst_interval = interval_demand.loc[interval_demand["Fulfillment_Rate"].idxmin(), "_time_interval"]
@@ -1064,10 +1323,11 @@ with tab1:
     
     # Calculate performance by day if multiple days selected
     if num_selected_days > 1:
-        daily_performance = df_filtered.groupby("_date").agg(
-            Rides=("Rides", "sum"),
-            Sessions=("Sessions", "sum")
-        ).reset_index()
+        daily_performance = (
+            daily_summary.groupby(level="_date", observed=True)[["Rides", "Sessions"]]
+            .sum()
+            .reset_index()
+        )
         daily_performance["Fulfillment"] = daily_performance["Rides"] / daily_performance["Sessions"] * 100
         
         best_day = daily_performance.loc[daily_performance["Fulfillment"].idxmax()]
@@ -1095,23 +1355,19 @@ with tab2:
         0
     )
     
-    # Categorize neighborhoods
-    def categorize_neighborhood(row):
-        fulfillment = row["Fulfillment Rate"]
-        utilization = row["Utilization"]
-        
-        if fulfillment >= 75 and utilization >= 5:
-            return "⭐ Star Performer"
-        elif fulfillment >= 75:
-            return "🎯 High Fulfillment"
-        elif utilization >= 5:
-            return "🔥 High Demand"
-        elif fulfillment < 60:
-            return "🔴 Critical"
-        else:
-            return "🟡 Moderate"
-    
-    neighborhood_analysis["Category"] = neighborhood_analysis.apply(categorize_neighborhood, axis=1)
+    # Categorize neighborhoods (first matching rule wins)
+    fulfillment = neighborhood_analysis["Fulfillment Rate"]
+    utilization = neighborhood_analysis["Utilization"]
+    neighborhood_analysis["Category"] = np.select(
+        [
+            (fulfillment >= 75) & (utilization >= 5),
+            fulfillment >= 75,
+            utilization >= 5,
+            fulfillment < 60,
+        ],
+        ["⭐ Star Performer", "🎯 High Fulfillment", "🔥 High Demand", "🔴 Critical"],
+        default="🟡 Moderate"
+    )
     
     # Show category breakdown
     st.markdown("#### 📊 Neighborhood Categories")
@@ -1392,15 +1648,14 @@ period_data["Expected_New_Rides"] = np.where(
 )
 
 # Step 10: Flag risk categories
-def categorize_allocation_risk(row):
-    if row["Neighborhood Fulfillment Rate"] < (confidence_threshold/100):
-        return "⚠️ High Risk"
-    elif row["Current_Efficiency"] < 2:
-        return "🟡 Medium Risk"
-    else:
-        return "✅ Low Risk"
-
-period_data["Risk_Category"] = period_data.apply(categorize_allocation_risk, axis=1)
+period_data["Risk_Category"] = np.select(
+    [
+        period_data["Neighborhood Fulfillment Rate"] < (confidence_threshold/100),
+        period_data["Current_Efficiency"] < 2,
+    ],
+    ["⚠️ High Risk", "🟡 Medium Risk"],
+    default="✅ Low Risk"
+)
 
 # ==============================
 # DISPLAY ALLOCATION RESULTS
@@ -1507,7 +1762,7 @@ st.dataframe(
 # Download allocation plan
 st.download_button(
     label="📥 Download Allocation Plan (CSV)",
-    data=display_df.to_csv(index=False).encode('utf-8'),
+    data=csv_download(display_df),
     file_name=f'allocation_plan_{selected_time_period}.csv',
     mime='text/csv',
     use_container_width=False
@@ -1523,9 +1778,7 @@ with col_viz1:
     
     # Create change visualization
     change_data = display_df[display_df["Vehicle_Change"] != 0].copy()
-    change_data["Change_Type"] = change_data["Vehicle_Change"].apply(
-        lambda x: "Increase" if x > 0 else "Decrease"
-    )
+    change_data["Change_Type"] = np.where(change_data["Vehicle_Change"] > 0, "Increase", "Decrease")
     
     if not change_data.empty:
         change_chart = alt.Chart(change_data).mark_bar().encode(
@@ -1680,48 +1933,11 @@ st.markdown("#### ⏰ Allocation Needs Across Time Periods")
 st.caption("Compare how vehicle needs shift throughout the day")
 
 # Calculate allocation for all time periods
-all_time_allocations = []
-
-for time_val in time_options:
-    period_subset = alloc_agg_df[alloc_agg_df[time_dim_alloc] == time_val].copy()
-    
-    if not period_subset.empty:
-        period_subset["Demand_Score"] = period_subset["Sessions"]
-        period_subset["Reliability_Score"] = np.where(
-            period_subset["Neighborhood Fulfillment Rate"] >= (confidence_threshold/100),
-            period_subset["Neighborhood Fulfillment Rate"] * 100,
-            period_subset["Neighborhood Fulfillment Rate"] * 50
-        )
-        period_subset["Unmet_Demand"] = period_subset["Missed Opportunity"]
-        period_subset["Demand_Density"] = np.where(
-            period_subset["Active (Avg)"] > 0,
-            period_subset["Sessions"] / period_subset["Active (Avg)"],
-            period_subset["Sessions"]
-        )
-        period_subset["Growth_Potential"] = np.where(
-            (period_subset["Demand_Density"] > period_subset["Demand_Density"].median()) &
-            (period_subset["Neighborhood Fulfillment Rate"] >= (confidence_threshold/100)),
-            period_subset["Unmet_Demand"] * 1.5,
-            period_subset["Unmet_Demand"]
-        )
-        period_subset["Allocation_Score"] = (
-            (period_subset["Demand_Score"] / period_subset["Demand_Score"].max() * 40) +
-            (period_subset["Reliability_Score"] / 100 * 25) +
-            (period_subset["Unmet_Demand"] / period_subset["Unmet_Demand"].max() * 20) +
-            (period_subset["Growth_Potential"] / period_subset["Growth_Potential"].max() * 15)
-        )
-        
-        total_score = period_subset["Allocation_Score"].sum()
-        period_subset["Recommended_Vehicles"] = np.floor(
-            (period_subset["Allocation_Score"] / total_score) * total_fleet_size
-        ).astype(int)
-        
-        period_subset["Time_Period"] = time_val
-        all_time_allocations.append(period_subset[["Neighborhood", "Time_Period", "Recommended_Vehicles"]])
+all_time_df = recommend_vehicles_by_period(
+    alloc_agg_df, time_dim_alloc, confidence_threshold, total_fleet_size
+)
 
-if all_time_allocations:
-    all_time_df = pd.concat(all_time_allocations, ignore_index=True)
-    
+if not all_time_df.empty:
     # Create heatmap of recommendations across time
     heatmap_chart = alt.Chart(all_time_df).mark_rect(stroke='#1a1a1a', strokeWidth=2).encode(
         x=alt.X(
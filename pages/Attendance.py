@@ -163,7 +163,10 @@ if selected_area != "All Areas":
 
 if search_term:
     if "Name" in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered["Name"].astype(str).str.contains(search_term, case=False)]
+        # Match against each distinct name once, then broadcast back to the rows
+        name_codes, names = pd.factorize(df_filtered["Name"].astype(str))
+        name_matches = np.asarray(names.str.contains(search_term, case=False), dtype=bool)
+        df_filtered = df_filtered[name_matches[name_codes]]
 
 # 3. Metrics Calculation
 metrics = calculate_metrics(df_filtered)
@@ -194,13 +197,16 @@ else:
     else:
         areas_to_show = []
 
+# Row positions per area, computed in one pass instead of a boolean scan per area
+area_rows = df_filtered.groupby("Area", sort=False).indices if areas_to_show else {}
+
 # Iterate through each area and create an expander
 for area in areas_to_show:
-    area_df = df_filtered[df_filtered["Area"] == area].copy()
-    
     # Skip if empty (though unlikely given filtering)
-    if area_df.empty:
+    if area not in area_rows:
         continue
+
+    area_df = df_filtered.iloc[area_rows[area]].copy()
         
     # --- Calculate Derived Columns (IN MINUTES) for ALL rows first ---
     